@@ -1,20 +1,65 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session
 from flask_restful import Api, Resource
 from flask_cors import CORS
+from burst_aggregator import BurstAggregator
+from chat_batch import BatchChat
+from chat_pipeline import ChatPipeline
 from gemini_integration import GeminiChat
 from language_detection import LanguageDetector
 from config import Config
-import re
+from metrics import metrics
+from llm_gateway import llm_gateway
+from profiling import ProfilingMiddleware, follow_request
+from resilience import request_deadline
+from session_store import create_session_store, new_session_id
+from trace_recorder import TraceRecorder
+from warmup import Warmup
+import hmac
+import json
+import logging
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = Config.SECRET_KEY
+if Config.PROFILE_DIR:
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+    llm_gateway.call_wrapper = follow_request
 api = Api(app)
 CORS(app)  # Enable CORS for all routes
 
 # Initialize services
 gemini_chat = GeminiChat()
 language_detector = LanguageDetector()
+chat_pipeline = ChatPipeline(gemini_chat, language_detector)
+session_store = create_session_store()
+batch_chat = BatchChat(chat_pipeline, session_store)
+trace_recorder = TraceRecorder()
+burst_aggregator = BurstAggregator(chat_pipeline, session_store) if Config.BURST_QUIET_SECONDS > 0 else None
+
+# The Gemini client and models are built in the background once a worker starts
+# (gunicorn.conf.py), or at the latest when its first request comes in
+warmup = Warmup(gemini_chat.warm_up, language_detector.warm_up)
+
+
+@app.before_request
+def start_warmup():
+    if not warmup.ready.is_set():
+        warmup.start()
+
+
+def load_state():
+    """Fetch the conversation state of the current session from the server-side store"""
+    return session_store.load(session.get('sid'))
+
+
+def save_state(state):
+    """Write the conversation state back to the store and return the session ID"""
+    if 'sid' not in session:
+        session['sid'] = new_session_id()
+    session_store.save(session['sid'], state)
+    chat_pipeline.memory.schedule_summary(session_store, session['sid'], state)
+    return session['sid']
 
 
 class ChatResource(Resource):
@@ -30,107 +75,144 @@ class ChatResource(Resource):
                     'language_settled': False
                 })
 
-            # Get or initialize session data
-            if 'conversation_history' not in session:
-                session['conversation_history'] = []
-                session['language'] = None
-                session['language_settled'] = False
-
-            conversation_history = session['conversation_history']
-            current_language = session.get('language')
-            language_settled = session.get('language_settled', False)
+            with trace_recorder.record('chat', user_message) as trace, \
+                    metrics.timer('alem_request_duration_seconds', endpoint='chat'):
+                trace['session_id'] = session.get('sid')
+                if burst_aggregator is not None:
+                    if 'sid' not in session:
+                        session['sid'] = new_session_id()
+                    trace['session_id'] = session['sid']
+                    payload = burst_aggregator.handle(session['sid'], user_message)
+                else:
+                    state = load_state()
+                    with request_deadline():
+                        payload = chat_pipeline.handle(state, user_message)
+                    trace['session_id'] = save_state(state)
+                trace['language'] = payload.get('current_language')
+            return jsonify(payload)
 
-            # Add user message to conversation history
-            conversation_history.append(user_message)
+        except Exception as e:
+            logging.error(f"Error handling chat request: {str(e)}")
+            metrics.inc('alem_errors_total', where='chat')
+            return jsonify({
+                'response': 'I hear you. Would you like to share more?',
+                'escalate': False,
+                'language_settled': False
+            })
 
-            # Detect language if not already settled
-            if not language_settled:
-                detected_language = language_detector.detect_language(user_message)
 
-                # Check if language is consistently used
-                settled_language = language_detector.is_language_settled(conversation_history)
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-                if settled_language:
-                    current_language = settled_language
-                    language_settled = True
-                    session['language'] = current_language
-                    session['language_settled'] = True
-                else:
-                    # Use detected language for this response, but don't settle yet
-                    current_language = detected_language
-
-            # Check for escalation keywords
-            should_escalate = self.check_escalation(user_message, current_language)
-
-            if should_escalate:
-                response = Config.HANDOVER_MESSAGES.get(
-                    current_language,
-                    Config.HANDOVER_MESSAGES['en']
-                )
-                # Clear conversation history for privacy
-                session.pop('conversation_history', None)
-                session.pop('language', None)
-                session.pop('language_settled', None)
-                return jsonify({
-                    'response': response,
-                    'escalate': True,
-                    'language_settled': language_settled
-                })
 
-            # Generate empathetic response
-            bot_response = gemini_chat.generate_response(
-                user_message,
-                current_language,
-                conversation_history
-            )
+class ChatStreamResource(Resource):
+    """Same turn as ChatResource, with the reply streamed as Server-Sent Events"""
 
-            # Update conversation history
-            conversation_history.append(bot_response)
-            session['conversation_history'] = conversation_history[-6:]  # Keep last 3 exchanges
+    def post(self):
+        session_id = None
+        try:
+            data = request.get_json()
+            user_message = data.get('message', '').strip()
 
-            return jsonify({
-                'response': bot_response,
-                'escalate': False,
-                'language_settled': language_settled,
-                'current_language': current_language
-            })
+            if not user_message:
+                events = [('message', {
+                    'response': Config.INITIAL_GREETING,
+                    'escalate': False,
+                    'language_settled': False
+                })]
+            else:
+                state = load_state()
+                with request_deadline():
+                    turn = chat_pipeline.prepare_turn(state, user_message)
+                session_id = save_state(state)
+                events = chat_pipeline.stream(state, turn)
 
         except Exception as e:
-            return jsonify({
+            logging.error(f"Error preparing streamed chat turn: {str(e)}")
+            metrics.inc('alem_errors_total', where='stream')
+            events = [('message', {
                 'response': 'I hear you. Would you like to share more?',
                 'escalate': False,
                 'language_settled': False
-            })
+            })]
+
+        def generate():
+            started = time.perf_counter()
+            try:
+                for event, payload in events:
+                    yield _sse(event, payload)
+                # History is only final once the stream completes
+                if session_id is not None:
+                    session_store.save(session_id, state)
+                    chat_pipeline.memory.schedule_summary(session_store, session_id, state)
+                metrics.observe('alem_request_duration_seconds', time.perf_counter() - started,
+                                endpoint='stream')
+            except Exception as e:
+                logging.error(f"Error streaming chat response: {str(e)}")
+                metrics.inc('alem_errors_total', where='stream')
+                yield _sse('error', {'response': 'I hear you. Would you like to share more?'})
+
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+class ChatBatchResource(Resource):
+    """Many (session_id, message) items in one call, for SMS and messaging bridges"""
+
+    def post(self):
+        token = request.headers.get('Authorization', '')
+        if not Config.BATCH_API_TOKEN or not hmac.compare_digest(token, f"Bearer {Config.BATCH_API_TOKEN}"):
+            return {'error': 'Forbidden'}, 403
 
-    def check_escalation(self, message, language):
-        """Check if message contains escalation keywords"""
-        keywords = Config.ESCALATION_KEYWORDS.get(
-            language,
-            Config.ESCALATION_KEYWORDS['en']
-        )
-        message_lower = message.lower()
+        data = request.get_json(silent=True) or {}
+        items = data.get('items')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return {'error': 'items must be a list of objects'}, 400
+        if len(items) > Config.BATCH_MAX_ITEMS:
+            return {'error': f'At most {Config.BATCH_MAX_ITEMS} items per batch'}, 400
 
-        for keyword in keywords:
-            if re.search(r'\b' + re.escape(keyword.lower()) + r'\b', message_lower):
-                return True
-        return False
+        with metrics.timer('alem_request_duration_seconds', endpoint='batch'):
+            results = batch_chat.run(items)
+        return jsonify({'results': results})
 
 
 class SessionResource(Resource):
     def delete(self):
         """Clear the current session"""
+        if 'sid' in session:
+            session_store.delete(session['sid'])
         session.clear()
         return jsonify({'message': 'Session cleared'})
 
 class HealthResource(Resource):
     def get(self):
-        return jsonify({'status': 'ok'})
+        """Liveness; passes while warm-up is still running"""
+        return jsonify({'status': 'ok', 'ready': warmup.ready.is_set()})
+
+
+class ReadinessResource(Resource):
+    def get(self):
+        """Readiness; passes once the Gemini client and models are built"""
+        if not warmup.ready.is_set():
+            return {'status': 'warming_up', 'ready': False}, 503
+        return jsonify({'status': 'ok', 'ready': True})
+
+
+class MetricsResource(Resource):
+    def get(self):
+        """Prometheus scrape endpoint, covering every worker process"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 # Add resources
 api.add_resource(ChatResource, '/api/chat')
+api.add_resource(ChatStreamResource, '/api/chat/stream')
+api.add_resource(ChatBatchResource, '/api/chat/batch')
 api.add_resource(SessionResource, '/api/session')
 api.add_resource(HealthResource, '/api/health')
+api.add_resource(ReadinessResource, '/api/health/ready')
+api.add_resource(MetricsResource, '/api/metrics')
 
 if __name__ == '__main__':
+    warmup.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
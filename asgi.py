@@ -0,0 +1,196 @@
+"""ASGI entry point: uvicorn asgi:application
+
+/api/chat is served by the async pipeline, so one worker holds many conversations
+in flight while they wait on Gemini. Every other route is the Flask app behind a
+WSGI adapter. The signed cookie and the server-side session store are shared with
+Flask, so clients can move between the two entry points.
+
+/api/chat/ws is a WebSocket carrying a whole conversation. Its state lives in memory
+for the life of the connection and is never stored.
+"""
+import asyncio
+import json
+import logging
+import time
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import dump_cookie
+
+from app import app, chat_pipeline, session_store, warmup
+from config import Config
+from metrics import metrics
+from profiling import AsyncProfilingMiddleware
+from resilience import request_deadline
+from session_store import new_session_id
+
+
+class AsyncChatApp:
+    def __init__(self, flask_app, pipeline, store):
+        self.flask_app = flask_app
+        self.pipeline = pipeline
+        self.store = store
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        # The Flask app profiles its own routes; the async chat needs its own middleware
+        self.handle_chat = AsyncProfilingMiddleware(self.chat) if Config.PROFILE_DIR else self.chat
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST':
+            await self.handle_chat(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            if scope['path'] == '/api/chat/ws':
+                await self.websocket_chat(receive, send)
+            else:
+                await send({'type': 'websocket.close', 'code': 1008})
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                warmup.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _load_session(self, scope):
+        cookies = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        morsel = cookies.get(self.cookie_name)
+        if morsel is None:
+            return {}
+        try:
+            return dict(self.serializer.loads(morsel.value, max_age=self.max_age))
+        except Exception:
+            return {}
+
+    async def _read_body(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    async def chat(self, scope, receive, send):
+        session = self._load_session(scope)
+        try:
+            data = json.loads(await self._read_body(receive) or b'{}')
+            user_message = data.get('message', '').strip()
+
+            if not user_message:
+                payload = {
+                    'response': Config.INITIAL_GREETING,
+                    'escalate': False,
+                    'language_settled': False
+                }
+            else:
+                with metrics.timer('alem_request_duration_seconds', endpoint='chat_async'):
+                    state = self.store.load(session.get('sid'))
+                    with request_deadline():
+                        payload = await self.pipeline.handle_async(state, user_message)
+                    if 'sid' not in session:
+                        session['sid'] = new_session_id()
+                    self.store.save(session['sid'], state)
+                    self.pipeline.memory.schedule_summary(self.store, session['sid'], state)
+
+        except Exception as e:
+            logging.error(f"Error handling async chat request: {str(e)}")
+            metrics.inc('alem_errors_total', where='chat')
+            payload = {
+                'response': 'I hear you. Would you like to share more?',
+                'escalate': False,
+                'language_settled': False
+            }
+
+        cookie = dump_cookie(self.cookie_name, self.serializer.dumps(session), httponly=True, path='/')
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'access-control-allow-origin', b'*'),
+                (b'set-cookie', cookie.encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps(payload).encode('utf-8')})
+
+    async def websocket_chat(self, receive, send):
+        """One conversation per connection: {"message": ...} in, streamed events out
+
+        Every event is a JSON object with an 'event' field: 'typing' when a message is
+        taken up, then the events of the SSE endpoint ('message', 'token', 'resources',
+        'fallback', 'done'). Cookies play no part, and the state is dropped when the
+        connection closes or sits idle for WEBSOCKET_IDLE_TIMEOUT_SECONDS.
+        """
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        await send({'type': 'websocket.accept'})
+
+        async def emit(event, data):
+            await send({'type': 'websocket.send', 'text': json.dumps(dict(data, event=event), ensure_ascii=False)})
+
+        state = {}
+        summary_task = None
+        try:
+            await emit('message', {
+                'response': Config.INITIAL_GREETING,
+                'escalate': False,
+                'language_settled': False
+            })
+            while True:
+                try:
+                    message = await asyncio.wait_for(receive(), Config.WEBSOCKET_IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    await send({'type': 'websocket.close', 'code': 1000, 'reason': 'idle timeout'})
+                    return
+                if message['type'] == 'websocket.disconnect':
+                    return
+
+                try:
+                    user_message = json.loads(message.get('text') or message.get('bytes') or b'{}')['message'].strip()
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    await emit('error', {'error': 'Expected {"message": "..."}'})
+                    continue
+                if not user_message:
+                    continue
+
+                await self._websocket_turn(state, user_message, emit)
+                if state.get('summary_pending') and (summary_task is None or summary_task.done()):
+                    summary_task = asyncio.ensure_future(self.pipeline.memory.refresh_summary_async(state))
+        except OSError:
+            pass  # The client went away mid-reply
+        finally:
+            if summary_task is not None:
+                summary_task.cancel()
+            state.clear()
+
+    async def _websocket_turn(self, state, user_message, emit):
+        started = time.perf_counter()
+        try:
+            await emit('typing', {})
+            with request_deadline():
+                turn = await self.pipeline.prepare_turn_async(state, user_message)
+                async for event, data in self.pipeline.stream_async(state, turn):
+                    await emit(event, data)
+            metrics.observe('alem_request_duration_seconds', time.perf_counter() - started, endpoint='websocket')
+        except Exception as e:
+            logging.error(f"Error handling WebSocket chat message: {str(e)}")
+            metrics.inc('alem_errors_total', where='websocket')
+            await emit('message', {
+                'response': 'I hear you. Would you like to share more?',
+                'escalate': False,
+                'language_settled': False
+            })
+
+
+application = AsyncChatApp(app, chat_pipeline, session_store)
@@ -0,0 +1,48 @@
+"""Scripted multi-turn conversations used by the benchmarks, in every supported language"""
+
+CONVERSATIONS = {
+    'en': [
+        "hi",
+        "I don't really know where to start",
+        "Something happened at the dormitory last week and I can't stop thinking about it",
+        "I haven't told anyone, I am scared of what my family will say",
+        "I can't sleep and I am exhausted all the time",
+        "thank you for listening",
+    ],
+    'am': [
+        "ሰላም",
+        "ከየት መጀመር እንዳለብኝ አላውቅም",
+        "ባለፈው ሳምንት በማደሪያው ውስጥ አንድ ነገር ደርሶብኛል እና ማሰብ ማቆም አልቻልኩም",
+        "ለማንም አልነገርኩም ቤተሰቤ ምን ይላሉ ብዬ እፈራለሁ",
+        "መተኛት አልቻልኩም ሁልጊዜ ድካም ይሰማኛል",
+        "ስላዳመጥሽኝ አመሰግናለሁ",
+    ],
+    'om': [
+        "akkam",
+        "Eessaa akkan jalqabu hin beeku",
+        "Torban darbe mana jireenyaa keessatti wanti tokko natti dhufe yaaduu dhiisuu hin dandeenye",
+        "Nama tokkoofillee hin himne maatiin koo maal jedhu jedheen sodaadha",
+        "Rafuu hin danda'u yeroo hunda dadhabaa dha",
+        "Na dhaggeeffachuu keef galatoomi",
+    ],
+    'ti': [
+        "ሰላም",
+        "ካበይ ክጅምር ከም ዘለኒ ኣይፈልጥን",
+        "ዝሓለፈ ሰሙን ኣብ መደቀሲ ሓደ ነገር ኣጋጢሙኒ ክሓስበሉ ከቋርጽ ኣይከኣልኩን",
+        "ንሓደ ሰብ እውን ኣይነገርኩን ስድራይ እንታይ ክብሉ እዮም ኢለ እፈርሕ",
+        "ክድቅስ ኣይክእልን ኩሉ ግዜ ድኻም ይስምዓኒ",
+        "ስለ ዝሰማዕክኒ የቐንየለይ",
+    ],
+}
+
+# Canned model output per language, long enough to pass the short-reply fallback check
+CANNED_REPLIES = {
+    'en': "I hear you, and I believe you. You are not alone in this, and it is not your fault. "
+          "Would it help to talk a little more about how you are feeling?",
+    'am': "እሰማሻለሁ፣ አምንሻለሁ። በዚህ ብቻሽን አይደለሽም፣ የአንቺም ጥፋት አይደለም። ስለሚሰማሽ ትንሽ ማውራት ይረዳሽ ይሆን?",
+    'om': "Sin dhagaya, sin amana. Kana keessatti kophaa kee hin jirtu, balleessaan kee miti. "
+          "Waa'ee miira keetii xiqqoo haasa'uun si gargaaraa?",
+    'ti': "ይሰምዓኪ እየ፣ ይኣምነኪ እየ። ኣብዚ በይንኺ ኣይኮንክን፣ ጌጋኺ'ውን ኣይኮነን። ብዛዕባ ስምዒትኪ ቁሩብ ምዝራብ ክሕግዘኪ ድዩ?",
+}
+
+CANNED_SUMMARY = "Student described an incident at the dormitory, fears family reaction, sleeps badly."
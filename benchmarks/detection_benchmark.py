@@ -0,0 +1,175 @@
+"""Accuracy and cost of each language-detection strategy on a labelled corpus
+
+Strategies:
+    local           LocalLanguageDetector alone, no upstream call
+    prompt          the Gemini detection prompt for every message
+    pipeline        LanguageDetector.detect_language: memo and local detector, Gemini when unsure
+    pipeline_batch  LanguageDetector.detect_languages over the whole corpus at once
+
+By default Gemini is the fake backend, answering with the corpus label for a
+--stub-accuracy share of messages and with the other language of the same script
+otherwise, so the upstream strategies measure routing and call counts rather than
+Gemini itself. --live sends the prompts to the real model (GEMINI_API_KEY).
+
+    python -m benchmarks.detection_benchmark
+    python -m benchmarks.detection_benchmark --strategies local pipeline --json
+    python -m benchmarks.detection_benchmark --live --strategies prompt pipeline
+"""
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.detection_corpus import DETECTION_CORPUS
+from benchmarks.load_test import _ms, percentile
+
+STRATEGIES = ('local', 'prompt', 'pipeline', 'pipeline_batch')
+LANGUAGES = ('en', 'am', 'om', 'ti')
+KINDS = ('short', 'long', 'code_switched', 'transliterated', 'informal')
+
+# The language a wrong stub answer picks: the other one written in the same script
+CONFUSABLE = {'en': 'om', 'om': 'en', 'am': 'ti', 'ti': 'am'}
+
+
+def stub_labels(accuracy: float, seed: int) -> Dict[str, str]:
+    rng = random.Random(seed)
+    return {text: language if rng.random() < accuracy else CONFUSABLE[language]
+            for text, language, _ in DETECTION_CORPUS}
+
+
+def _upstream_calls(records) -> int:
+    """Gemini calls, hedges included, out of captured metric records"""
+    return sum(value for name, _, value in records
+               if name in ('alem_llm_calls_total', 'alem_llm_hedges_total'))
+
+
+def detectors() -> Dict[str, Callable[[], Callable[[str], str]]]:
+    """Factories of a fresh detection function per strategy, so no memo carries over"""
+    from config import Config
+    from language_detection import LanguageDetector, LocalLanguageDetector
+    from llm_gateway import llm_gateway
+
+    def local():
+        detector = LocalLanguageDetector()
+        return lambda text: detector.detect(text)[0] or Config.DEFAULT_LANGUAGE
+
+    def prompt():
+        detector = LanguageDetector()
+
+        def detect(text: str) -> str:
+            prompt_text = Config.LANGUAGE_DETECTION_PROMPT.format(text=text)
+            response = llm_gateway.call(
+                'detection',
+                lambda timeout: detector.model.generate_content(prompt_text, request_options={'timeout': timeout})
+            )
+            return detector._validate(text, response.text, None)
+        return detect
+
+    def pipeline():
+        return LanguageDetector().detect_language
+
+    return {'local': local, 'prompt': prompt, 'pipeline': pipeline}
+
+
+def run_strategy(strategy: str, concurrency: int) -> Dict:
+    from language_detection import LanguageDetector
+    from metrics import metrics
+
+    texts = [text for text, _, _ in DETECTION_CORPUS]
+    if strategy == 'pipeline_batch':
+        detector = LanguageDetector()
+        started = time.perf_counter()
+        with metrics.capture() as records:
+            predictions = detector.detect_languages(texts)
+        elapsed = time.perf_counter() - started
+        # One call serves every message, so each waits for all of it
+        return {'predictions': predictions, 'latencies': [elapsed] * len(texts),
+                'upstream_calls': _upstream_calls(records)}
+
+    detect = detectors()[strategy]()
+
+    def measure(text: str):
+        started = time.perf_counter()
+        with metrics.capture() as records:
+            language = detect(text)
+        return language, time.perf_counter() - started, _upstream_calls(records)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(measure, texts))
+    return {'predictions': [language for language, _, _ in results],
+            'latencies': [seconds for _, seconds, _ in results],
+            'upstream_calls': sum(calls for _, _, calls in results)}
+
+
+def score(run: Dict) -> Dict:
+    confusion = {language: Counter() for language in LANGUAGES}
+    by_kind = {kind: [0, 0] for kind in KINDS}
+    correct = 0
+    for (_, language, kind), predicted in zip(DETECTION_CORPUS, run['predictions']):
+        confusion[language][predicted] += 1
+        by_kind[kind][1] += 1
+        if predicted == language:
+            correct += 1
+            by_kind[kind][0] += 1
+    total = len(DETECTION_CORPUS)
+    return {
+        'accuracy': round(correct / total, 3),
+        'accuracy_by_kind': {kind: round(hits / count, 3) for kind, (hits, count) in by_kind.items() if count},
+        'confusion': {language: dict(row) for language, row in confusion.items()},
+        'latency': {'p50': percentile(run['latencies'], 0.50), 'p95': percentile(run['latencies'], 0.95)},
+        'upstream_calls_per_message': round(run['upstream_calls'] / total, 3),
+    }
+
+
+def print_report(report: Dict):
+    kinds = [kind for kind in KINDS if any(kind in result['accuracy_by_kind'] for result in report.values())]
+    print(f"{'strategy':<15}{'accuracy':>9}" + ''.join(f'{kind[:14]:>15}' for kind in kinds)
+          + f"{'p50':>9}{'p95':>9}{'calls/msg':>11}")
+    for strategy, result in report.items():
+        print(f"{strategy:<15}{result['accuracy']:>9.3f}"
+              + ''.join(f"{result['accuracy_by_kind'].get(kind, 0):>15.3f}" for kind in kinds)
+              + f"{_ms(result['latency']['p50']):>9}{_ms(result['latency']['p95']):>9}"
+              + f"{result['upstream_calls_per_message']:>11}")
+    for strategy, result in report.items():
+        print(f"\n{strategy}: rows are the labelled language, columns the detected one")
+        columns = list(LANGUAGES) + sorted({predicted for row in result['confusion'].values()
+                                            for predicted in row if predicted not in LANGUAGES})
+        print('      ' + ''.join(f'{language:>6}' for language in columns))
+        for language in LANGUAGES:
+            print(f'{language:<6}' + ''.join(f"{result['confusion'][language].get(predicted, 0):>6}"
+                                             for predicted in columns))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--live', action='store_true', help='call the real Gemini model')
+    parser.add_argument('--stub-accuracy', type=float, default=0.95, help='share of right fake Gemini answers')
+    parser.add_argument('--detection-latency', default='0.35:0.4', help='fake median[:sigma] seconds')
+    parser.add_argument('--concurrency', type=int, default=8, help='messages detected at once')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    if not args.live:
+        from benchmarks.fake_gemini import FakeGeminiBackend, LatencyProfile
+
+        FakeGeminiBackend(latency={'detection': LatencyProfile.parse(args.detection_latency)},
+                          labels=stub_labels(args.stub_accuracy, args.seed), seed=args.seed).install()
+
+    from llm_gateway import llm_gateway
+    # Strategies send the same prompts; each has to pay for its own calls
+    llm_gateway.single_flight.windows = {}
+
+    report = {strategy: score(run_strategy(strategy, args.concurrency)) for strategy in args.strategies}
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Labelled messages for the language-detection benchmark, as (text, language, kind)
+
+Kinds:
+    short           one or two words, where the script alone often cannot decide
+    long            full sentences in one language
+    code_switched   mostly one language with words of another mixed in
+    transliterated  Amharic or Tigrigna written in Latin letters
+    informal        lowercase, abbreviated or misspelt Latin-script chat
+
+Greetings shared between languages (ሰላም) are labelled with the language of the
+conversation they were taken from, so they show up as honest confusions.
+"""
+
+DETECTION_CORPUS = [
+    # English
+    ("hi", 'en', 'short'),
+    ("ok", 'en', 'short'),
+    ("yes", 'en', 'short'),
+    ("thanks", 'en', 'short'),
+    ("not really", 'en', 'short'),
+    ("I couldn't sleep last night and I keep thinking about what happened", 'en', 'long'),
+    ("I don't want anyone at school to find out about this", 'en', 'long'),
+    ("My family would not understand if I told them", 'en', 'long'),
+    ("I can't focus on my classes anymore and my grades are dropping", 'en', 'long'),
+    ("I just want to talk to someone, selam", 'en', 'code_switched'),
+    ("honestly I'm so tired of all this, ishi", 'en', 'code_switched'),
+    ("nothing feels fine lately, nagaa", 'en', 'code_switched'),
+    ("idk what to do anymore", 'en', 'informal'),
+    ("im so tired of everything", 'en', 'informal'),
+    ("cant sleep again", 'en', 'informal'),
+    ("u still there?", 'en', 'informal'),
+
+    # Amharic
+    ("ሰላም", 'am', 'short'),
+    ("እሺ", 'am', 'short'),
+    ("አመሰግናለሁ", 'am', 'short'),
+    ("አዎ", 'am', 'short'),
+    ("ደህና ነኝ", 'am', 'short'),
+    ("ትናንት ማታ መተኛት አልቻልኩም በጣም ፈርቻለሁ", 'am', 'long'),
+    ("ስለ ሆነው ነገር ለማንም መናገር አልፈልግም", 'am', 'long'),
+    ("ቤተሰቤ ቢያውቁ ምን እንደሚሉ አላውቅም", 'am', 'long'),
+    ("በትምህርቴ ላይ ማተኮር አልቻልኩም", 'am', 'long'),
+    ("ሰላም, I just need someone to talk to ዛሬ", 'am', 'code_switched'),
+    ("እኔ really አልችልም ዛሬ በጣም ደክሞኛል", 'am', 'code_switched'),
+    ("my roommate ነው ችግሩ እና ምን እንደማደርግ አላውቅም", 'am', 'code_switched'),
+    ("selam, endet neh?", 'am', 'transliterated'),
+    ("ameseginalehu", 'am', 'transliterated'),
+    ("betam fercheyalehu", 'am', 'transliterated'),
+    ("min madreg alebign?", 'am', 'transliterated'),
+    ("ishi", 'am', 'transliterated'),
+
+    # Oromifa
+    ("akkam", 'om', 'short'),
+    ("nagaa", 'om', 'short'),
+    ("eeyyee", 'om', 'short'),
+    ("galatoomi", 'om', 'short'),
+    ("tole", 'om', 'short'),
+    ("Edana halkan rafuu hin dandeenye baay'ee sodaadheera", 'om', 'long'),
+    ("Waan ta'e nama tokkollee himuu hin barbaadu", 'om', 'long'),
+    ("Maatiin koo yoo beekan maal akka jedhan hin beeku", 'om', 'long'),
+    ("Barumsa koo irratti xiyyeeffachuu hin dandeenye", 'om', 'long'),
+    ("akkam, I need to talk to someone har'a", 'om', 'code_switched'),
+    ("ani baay'ee tired dha har'a", 'om', 'code_switched'),
+    ("my friend waliin wal dhabne", 'om', 'code_switched'),
+    ("nan sodaadha", 'om', 'informal'),
+    ("hin beeku", 'om', 'informal'),
+    ("maal godhu qaba?", 'om', 'informal'),
+    ("galatoomaa baay'ee", 'om', 'informal'),
+
+    # Tigrigna
+    ("ሰላም", 'ti', 'short'),
+    ("ከመይ ኣለኻ", 'ti', 'short'),
+    ("የቐንየለይ", 'ti', 'short'),
+    ("እወ", 'ti', 'short'),
+    ("ሕራይ", 'ti', 'short'),
+    ("ትማሊ ለይቲ ድቃስ ኣይመጸንን ኣዝየ ፈሪሐ", 'ti', 'long'),
+    ("ብዛዕባ እቲ ዝተፈጸመ ንዝኾነ ሰብ ክነግር ኣይደልን", 'ti', 'long'),
+    ("ስድራይ እንተፈሊጦም እንታይ ከም ዝብሉ ኣይፈልጥን", 'ti', 'long'),
+    ("ኣብ ትምህርተይ ኣትኩሮ ክገብር ኣይከኣልኩን", 'ti', 'long'),
+    ("ሰላም, I don't know what to do ሎሚ", 'ti', 'code_switched'),
+    ("ኣነ really ደኺመ እየ ሎሚ", 'ti', 'code_switched'),
+    ("my friend እዩ ጸገመይ ኣይፈልጥን እንታይ ከም ዝገብር", 'ti', 'code_switched'),
+    ("kemey aleka", 'ti', 'transliterated'),
+    ("yekenyeley", 'ti', 'transliterated'),
+    ("kulu gize ferihe", 'ti', 'transliterated'),
+    ("entay egber?", 'ti', 'transliterated'),
+    ("hiray", 'ti', 'transliterated'),
+]
@@ -0,0 +1,262 @@
+"""Offline stand-in for genai.GenerativeModel
+
+Answers the app's detection, generation, streaming and summary calls with canned
+multilingual text after a latency drawn from a per-stage log-normal distribution,
+failing a configurable fraction of calls the way the real client does. Every call
+is counted per stage; with a call log path set, calls are also appended to that
+file so counts can be gathered from several gunicorn workers.
+
+Install it before the app is imported. The gateway imports google.generativeai lazily
+and builds its model handles on first use or in the warm-up thread, so the fake has to
+patch the module before the app can start that warm-up:
+
+    backend = FakeGeminiBackend(...)
+    backend.install()
+    from app import app
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+from benchmarks.conversations import CANNED_REPLIES, CANNED_SUMMARY
+from language_detection import LocalLanguageDetector
+
+_DETECTION_TEXT = re.compile(r'Text: "(.*)"', re.DOTALL)
+_BATCH_DETECTION_TEXT = re.compile(r'^\s*\d+\. (".*")$', re.MULTILINE)
+_CONTENTS_LANGUAGE = re.compile(r'- Language: (\w+)')
+
+
+@dataclass
+class LatencyProfile:
+    """Log-normal latency with the given median; sigma widens the tail (p99 ~ median * e^(2.33 sigma))"""
+    median: float
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyProfile':
+        """'1.2' or '1.2:0.6' (median seconds, sigma)"""
+        median, _, sigma = spec.partition(':')
+        return cls(float(median), float(sigma) if sigma else 0.5)
+
+
+DEFAULT_LATENCY = {
+    'detection': LatencyProfile(0.35, 0.4),
+    'generation': LatencyProfile(1.5, 0.5),
+    'summary': LatencyProfile(2.0, 0.5),
+}
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens, max(1, len(text) // 4))
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, candidates_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = candidates_tokens
+        self.total_token_count = prompt_tokens + candidates_tokens
+
+
+class FakeStream:
+    """Streamed response; like the real client it is returned once the first chunk is in"""
+
+    def __init__(self, chunks: List[str], interval: float):
+        self._chunks = chunks
+        self._interval = interval
+        self.usage_metadata = _Usage(0, max(1, len(''.join(chunks)) // 4))
+
+    def __iter__(self) -> Iterator[FakeResponse]:
+        for index, chunk in enumerate(self._chunks):
+            if index and self._interval:
+                time.sleep(self._interval)
+            yield FakeResponse(chunk)
+
+
+class FakeAsyncStream(FakeStream):
+    async def __aiter__(self):
+        for index, chunk in enumerate(self._chunks):
+            if index and self._interval:
+                await asyncio.sleep(self._interval)
+            yield FakeResponse(chunk)
+
+
+class FakeGeminiBackend:
+    def __init__(self, latency: Optional[Dict[str, LatencyProfile]] = None, error_rate: float = 0.0,
+                 stream_chunks: int = 6, chunk_interval: float = 0.05,
+                 labels: Optional[Dict[str, str]] = None, seed: Optional[int] = None,
+                 call_log: Optional[str] = None):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.error_rate = error_rate
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval
+        # Known languages of detection texts; anything else is answered by the local detector
+        self.labels = labels or {}
+        self.call_log = call_log
+
+        self.calls = Counter()
+        self.call_latencies = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._local_detector = LocalLanguageDetector()
+
+    @classmethod
+    def from_env(cls) -> 'FakeGeminiBackend':
+        """Settings passed to gunicorn workers through FAKE_GEMINI_* environment variables"""
+        latency = {}
+        for item in filter(None, os.environ.get('FAKE_GEMINI_LATENCY', '').split(',')):
+            stage, _, spec = item.partition('=')
+            latency[stage.strip()] = LatencyProfile.parse(spec)
+        return cls(
+            latency=latency,
+            error_rate=float(os.environ.get('FAKE_GEMINI_ERROR_RATE', 0)),
+            seed=int(os.environ['FAKE_GEMINI_SEED']) if 'FAKE_GEMINI_SEED' in os.environ else None,
+            call_log=os.environ.get('FAKE_GEMINI_CALL_LOG'),
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        env = {
+            'FAKE_GEMINI_LATENCY': ','.join(f'{stage}={profile.median}:{profile.sigma}'
+                                            for stage, profile in self.latency.items()),
+            'FAKE_GEMINI_ERROR_RATE': str(self.error_rate),
+        }
+        if self.call_log:
+            env['FAKE_GEMINI_CALL_LOG'] = self.call_log
+        return env
+
+    def install(self):
+        """Replace the genai client entry points used by the app with this backend"""
+        backend = self
+
+        def model_factory(model_name='gemini-2.5-flash', system_instruction=None, **kwargs):
+            return FakeGenerativeModel(backend, model_name, system_instruction)
+
+        model_factory.from_cached_content = lambda cached, **kwargs: FakeGenerativeModel(
+            backend, getattr(cached, 'model', 'cached'), None)
+        genai.GenerativeModel = model_factory
+        genai.configure = lambda **kwargs: None
+
+    # Call accounting
+
+    def _record(self, stage: str, seconds: float, outcome: str):
+        with self._lock:
+            self.calls[stage] += 1
+            self.call_latencies.setdefault(stage, []).append(seconds)
+        if self.call_log:
+            # Single small O_APPEND writes do not interleave between processes
+            fd = os.open(self.call_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, f'{stage}\t{seconds:.6f}\t{outcome}\n'.encode())
+            finally:
+                os.close(fd)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.call_latencies.clear()
+
+    @staticmethod
+    def read_call_log(path: str):
+        """Calls and upstream latencies per stage recorded in a call log"""
+        calls, latencies = Counter(), {}
+        if os.path.exists(path):
+            with open(path) as log:
+                for line in log:
+                    stage, seconds, _ = line.rstrip('\n').split('\t')
+                    calls[stage] += 1
+                    latencies.setdefault(stage, []).append(float(seconds))
+        return calls, latencies
+
+    # Simulated upstream behaviour
+
+    def plan(self, stage: str, timeout: Optional[float]):
+        """Draw (delay, error) for one call; the error is raised once the delay has elapsed"""
+        with self._lock:
+            delay = self.latency.get(stage, self.latency['generation']).sample(self._rng)
+            failed = self._rng.random() < self.error_rate
+        if timeout is not None and delay > timeout:
+            return timeout, api_exceptions.DeadlineExceeded('Fake Gemini call timed out')
+        if failed:
+            return delay, api_exceptions.ServiceUnavailable('Fake Gemini unavailable')
+        return delay, None
+
+    def answer(self, stage: str, contents) -> str:
+        if stage == 'detection':
+            if 'JSON array' in contents:
+                texts = [json.loads(text) for text in _BATCH_DETECTION_TEXT.findall(contents)]
+                return json.dumps([self._language_of(text) for text in texts])
+            match = _DETECTION_TEXT.search(contents)
+            return self._language_of(match.group(1) if match else '')
+        if stage == 'summary':
+            return CANNED_SUMMARY
+        match = _CONTENTS_LANGUAGE.search(str(contents[-1]['parts'][0]))
+        language = match.group(1) if match else 'en'
+        return CANNED_REPLIES.get(language, CANNED_REPLIES['en'])
+
+    def _language_of(self, text: str) -> str:
+        return self.labels.get(text) or self._local_detector.detect(text)[0] or 'en'
+
+    def chunks(self, text: str) -> List[str]:
+        words = text.split(' ')
+        size = max(1, math.ceil(len(words) / self.stream_chunks))
+        return [' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '')
+                for i in range(0, len(words), size)]
+
+
+class FakeGenerativeModel:
+    def __init__(self, backend: FakeGeminiBackend, model_name: str, system_instruction: Optional[str]):
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    @staticmethod
+    def _stage(contents, stream: bool) -> str:
+        if isinstance(contents, str):
+            return 'detection' if 'Respond ONLY with' in contents else 'summary'
+        return 'stream' if stream else 'generation'
+
+    @staticmethod
+    def _prompt_tokens(contents) -> int:
+        return len(str(contents)) // 4
+
+    def generate_content(self, contents, stream: bool = False, request_options: Optional[Dict] = None, **kwargs):
+        stage = self._stage(contents, stream)
+        delay, error = self.backend.plan(stage, (request_options or {}).get('timeout'))
+        time.sleep(delay)
+        self.backend._record(stage, delay, type(error).__name__ if error else 'ok')
+        if error:
+            raise error
+        text = self.backend.answer(stage, contents)
+        if stream:
+            return FakeStream(self.backend.chunks(text), self.backend.chunk_interval)
+        return FakeResponse(text, self._prompt_tokens(contents))
+
+    async def generate_content_async(self, contents, stream: bool = False, request_options: Optional[Dict] = None,
+                                     **kwargs):
+        stage = self._stage(contents, stream)
+        delay, error = self.backend.plan(stage, (request_options or {}).get('timeout'))
+        await asyncio.sleep(delay)
+        self.backend._record(stage, delay, type(error).__name__ if error else 'ok')
+        if error:
+            raise error
+        text = self.backend.answer(stage, contents)
+        if stream:
+            return FakeAsyncStream(self.backend.chunks(text), self.backend.chunk_interval)
+        return FakeResponse(text, self._prompt_tokens(contents))
@@ -0,0 +1,11 @@
+"""WSGI entry point serving the app against the fake Gemini backend
+
+    gunicorn benchmarks.fake_wsgi:app
+
+The backend is configured from FAKE_GEMINI_* environment variables, see FakeGeminiBackend.from_env.
+"""
+from benchmarks.fake_gemini import FakeGeminiBackend
+
+FakeGeminiBackend.from_env().install()
+
+from app import app  # noqa: E402  (the fake has to patch google.generativeai before the gateway builds a model)
@@ -0,0 +1,259 @@
+"""Load test for /api/chat against the fake Gemini backend
+
+Runs scripted multi-turn conversations in all four languages, one virtual user per
+thread, and reports end-to-end latency percentiles, throughput and upstream LLM calls
+per request for each stage.
+
+    python -m benchmarks.load_test --users 20 --conversations 3
+    python -m benchmarks.load_test --mode gunicorn --workers 4 --threads 8 --users 50
+    python -m benchmarks.load_test --generation-latency 2.5:0.8 --error-rate 0.05 --json
+
+In-process mode drives the Flask app through its test client; gunicorn mode starts
+benchmarks.fake_wsgi under gunicorn and talks to it over HTTP.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.conversations import CONVERSATIONS
+
+STAGES = ('detection', 'generation', 'stream', 'summary')
+
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return '-' if seconds is None else f'{seconds * 1000:.0f}ms'
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {language: [] for language in CONVERSATIONS}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, language: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[language].append(seconds)
+            if not ok:
+                self.errors += 1
+
+    @property
+    def all_latencies(self) -> List[float]:
+        return [seconds for samples in self.latencies.values() for seconds in samples]
+
+
+def run_users(post_factory: Callable[[], Callable[[str], bool]], users: int, conversations: int,
+              endpoint: str, think_time: float) -> Tuple[Results, float]:
+    """Each user holds its own session and runs its conversations turn by turn"""
+    results = Results()
+    languages = list(CONVERSATIONS)
+
+    def user(index: int):
+        for round_index in range(conversations):
+            post = post_factory()  # Fresh cookie jar, i.e. a new conversation
+            language = languages[(index + round_index) % len(languages)]
+            for message in CONVERSATIONS[language]:
+                started = time.perf_counter()
+                try:
+                    ok = post(endpoint, message)
+                except Exception:
+                    ok = False
+                results.record(language, time.perf_counter() - started, ok)
+                if think_time:
+                    time.sleep(think_time)
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def _ok(status: int, body: bytes, endpoint: str) -> bool:
+    if status != 200:
+        return False
+    if endpoint.endswith('/stream'):
+        return b'event: error' not in body
+    return 'response' in json.loads(body)
+
+
+def run_inprocess(backend, args) -> Tuple[Results, float, Tuple]:
+    backend.install()
+    from app import app
+
+    def post_factory():
+        client = app.test_client()
+
+        def post(endpoint: str, message: str) -> bool:
+            response = client.post(endpoint, json={'message': message})
+            return _ok(response.status_code, response.get_data(), endpoint)
+        return post
+
+    results, elapsed = run_users(post_factory, args.users, args.conversations, args.endpoint, args.think_time)
+    time.sleep(args.drain)  # Let background summaries finish so they are counted
+    return results, elapsed, (backend.calls, backend.call_latencies)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(base_url + '/api/health', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not come up in time')
+
+
+def run_gunicorn(backend, args) -> Tuple[Results, float, Tuple]:
+    from benchmarks.fake_gemini import FakeGeminiBackend
+
+    workdir = tempfile.mkdtemp(prefix='alem-load-')
+    backend.call_log = os.path.join(workdir, 'calls.log')
+    port = _free_port()
+    env = dict(os.environ, **backend.to_env())
+    # Sessions have to be shared by the workers
+    env.setdefault('SESSION_BACKEND', 'sqlite')
+    env.setdefault('SESSION_SQLITE_PATH', os.path.join(workdir, 'sessions.db'))
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'benchmarks.fake_wsgi:app'],
+        env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        _wait_until_up(base_url, process)
+
+        def post_factory():
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+            def post(endpoint: str, message: str) -> bool:
+                request = urllib.request.Request(
+                    base_url + endpoint, data=json.dumps({'message': message}).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'}
+                )
+                with opener.open(request, timeout=120) as response:
+                    return _ok(response.status, response.read(), endpoint)
+            return post
+
+        results, elapsed = run_users(post_factory, args.users, args.conversations, args.endpoint, args.think_time)
+        time.sleep(args.drain)
+        return results, elapsed, FakeGeminiBackend.read_call_log(backend.call_log)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(results: Results, elapsed: float, calls, call_latencies) -> Dict:
+    latencies = results.all_latencies
+    requests = len(latencies)
+    return {
+        'requests': requests,
+        'errors': results.errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+        'latency': {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+        },
+        'latency_by_language': {
+            language: {'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95)}
+            for language, samples in results.latencies.items() if samples
+        },
+        'llm_calls_per_request': {
+            stage: round(calls.get(stage, 0) / requests, 3) if requests else None for stage in STAGES
+        },
+        'upstream_latency': {
+            stage: {'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95),
+                    'p99': percentile(samples, 0.99)}
+            for stage, samples in call_latencies.items()
+        },
+    }
+
+
+def print_report(summary: Dict):
+    latency = summary['latency']
+    print(f"requests       {summary['requests']} ({summary['errors']} errors) "
+          f"in {summary['elapsed_seconds']:.1f}s, {summary['requests_per_second']} req/s")
+    print(f"latency        p50 {_ms(latency['p50'])}  p95 {_ms(latency['p95'])}  p99 {_ms(latency['p99'])}")
+    for language, stats in summary['latency_by_language'].items():
+        print(f"  {language:<12} p50 {_ms(stats['p50'])}  p95 {_ms(stats['p95'])}")
+    print('llm calls per request and upstream latency by stage')
+    for stage in STAGES:
+        upstream = summary['upstream_latency'].get(stage, {})
+        print(f"  {stage:<12} {summary['llm_calls_per_request'][stage]:<7} "
+              f"p50 {_ms(upstream.get('p50'))}  p95 {_ms(upstream.get('p95'))}  p99 {_ms(upstream.get('p99'))}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--endpoint', default='/api/chat', choices=('/api/chat', '/api/chat/stream'))
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--conversations', type=int, default=2, help='conversations per user')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds between turns')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--detection-latency', default='0.35:0.4', help='median[:sigma] seconds')
+    parser.add_argument('--generation-latency', default='1.5:0.5', help='median[:sigma] seconds')
+    parser.add_argument('--summary-latency', default='2.0:0.5', help='median[:sigma] seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--drain', type=float, default=1.0, help='seconds to wait for background calls')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    from benchmarks.fake_gemini import FakeGeminiBackend, LatencyProfile
+
+    generation = LatencyProfile.parse(args.generation_latency)
+    backend = FakeGeminiBackend(
+        latency={
+            'detection': LatencyProfile.parse(args.detection_latency),
+            'generation': generation,
+            'stream': generation,  # Time to first chunk
+            'summary': LatencyProfile.parse(args.summary_latency),
+        },
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    run = run_gunicorn if args.mode == 'gunicorn' else run_inprocess
+    results, elapsed, (calls, call_latencies) = run(backend, args)
+    summary = report(results, elapsed, calls, call_latencies)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == '__main__':
+    main()
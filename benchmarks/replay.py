@@ -0,0 +1,239 @@
+"""Replays recorded request traces against the app with the fake Gemini backend
+
+Traces written with TRACE_DIR set (trace_recorder.py) carry no text, so each request
+is replayed with a synthetic message of the recorded length, script and language,
+built to take the recorded path: escalation and crisis traces get a matching keyword,
+the others plain conversation text. Requests are sent at their recorded offsets
+(scaled by --speed), each session with its own cookie, and the report sets replayed
+latency, paths and LLM calls per request against what was recorded.
+
+    python -m benchmarks.replay traces/ --speed 2
+    python -m benchmarks.replay traces/ --json > before.json
+    python -m benchmarks.replay traces/ --compare before.json
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.conversations import CONVERSATIONS
+from benchmarks.load_test import STAGES, _ms, percentile
+from config import Config
+from keyword_matcher import keyword_matcher
+
+# Language of the synthetic text for a script when the trace has no reply language
+SCRIPT_LANGUAGES = {'ethiopic': 'am', 'latin': 'en'}
+
+
+def load_traces(paths: List[str]) -> List[Dict]:
+    """/api/chat traces from trace files or directories of them, in arrival order"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, 'traces-*.jsonl'))) if os.path.isdir(path) else [path])
+    traces = []
+    for name in files:
+        with open(name) as f:
+            traces.extend(json.loads(line) for line in f if line.strip())
+    return sorted((trace for trace in traces if trace.get('endpoint') == 'chat'), key=lambda trace: trace['at'])
+
+
+def _filler_words(language: str) -> List[str]:
+    # Words of the scripted messages that answer normally, so filler never adds a keyword
+    messages = [message for message in CONVERSATIONS[language]
+                if not any(hits for hits in keyword_matcher.scan(message).values())]
+    return ' '.join(messages).split()
+
+
+FILLER = {language: _filler_words(language) for language in CONVERSATIONS}
+
+
+def synthesize(trace: Dict, rng: random.Random) -> str:
+    """Text of the traced length, script and language that takes the traced path"""
+    script = trace.get('script')
+    language = trace.get('language')
+    if language not in FILLER:
+        language = SCRIPT_LANGUAGES.get(script, Config.DEFAULT_LANGUAGE)
+    if script == 'none':
+        return '?' * max(trace['length'], 1)
+
+    if trace.get('path') == 'escalation':
+        words = [Config.ESCALATION_KEYWORDS[language][0]]
+    elif trace.get('path') == 'crisis':
+        words = [Config.SAFETY_KEYWORDS['suicidal'][language][0]]
+    else:
+        words = []
+    pools = [FILLER[language], FILLER['am' if language == 'en' else 'en']] if script == 'mixed' else [FILLER[language]]
+    while len(' '.join(words)) < trace['length']:
+        pool = pools[len(words) % len(pools)]
+        words.append(pool[rng.randrange(len(pool))])
+    text = ' '.join(words)
+    # Keywords are kept whole even when they are longer than the traced message
+    return text[:max(trace['length'], len(words[0]))].strip()
+
+
+class Replay:
+    def __init__(self, app, speed: float, concurrency: int, seed: Optional[int]):
+        self.app = app
+        self.speed = speed
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.results = []
+        self._cookies = {}
+        self._lock = threading.Lock()
+
+    def send(self, trace: Dict, message: str):
+        from metrics import metrics
+        from trace_recorder import TraceRecorder
+
+        session = trace.get('session')
+        headers = {}
+        with self._lock:
+            if session in self._cookies:
+                headers['Cookie'] = self._cookies[session]
+        client = self.app.test_client(use_cookies=False)
+        started = time.perf_counter()
+        with metrics.capture() as records:
+            response = client.post('/api/chat', json={'message': message}, headers=headers)
+        elapsed = time.perf_counter() - started
+
+        cookie = response.headers.get('Set-Cookie')
+        if session and cookie:
+            with self._lock:
+                self._cookies[session] = cookie.split(';', 1)[0]
+        replayed = TraceRecorder.summarize(records)
+        with self._lock:
+            self.results.append({'trace': trace, 'ok': response.status_code == 200,
+                                 'duration': elapsed, **replayed})
+
+    def run(self, traces: List[Dict]) -> float:
+        """Send every trace at its recorded offset; returns the elapsed seconds"""
+        messages = [synthesize(trace, self.rng) for trace in traces]
+        first = traces[0]['at']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='replay') as executor:
+            for trace, message in zip(traces, messages):
+                delay = (trace['at'] - first) / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, trace, message)
+        return time.perf_counter() - started
+
+
+def _latency(samples: List[float]) -> Dict:
+    return {'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95), 'p99': percentile(samples, 0.99)}
+
+
+def _calls_per_request(call_counts: List[Dict]) -> Dict:
+    totals = Counter()
+    for calls in call_counts:
+        totals.update(calls)
+    return {stage: round(totals.get(stage, 0) / len(call_counts), 3) for stage in STAGES}
+
+
+def report(results: List[Dict], elapsed: float, upstream_calls: Counter) -> Dict:
+    traces = [result['trace'] for result in results]
+    return {
+        'requests': len(results),
+        'errors': sum(not result['ok'] for result in results),
+        'elapsed_seconds': round(elapsed, 3),
+        'latency': {
+            'recorded': _latency([trace['duration'] for trace in traces]),
+            'replayed': _latency([result['duration'] for result in results]),
+        },
+        'paths': {
+            'recorded': dict(Counter(trace['path'] for trace in traces)),
+            'replayed': dict(Counter(result['path'] for result in results)),
+        },
+        'llm_calls_per_request': {
+            'recorded': _calls_per_request([trace.get('llm_calls', {}) for trace in traces]),
+            'replayed': _calls_per_request([result['llm_calls'] for result in results]),
+        },
+        # Includes background calls such as summaries, which no single request waits for
+        'upstream_calls': dict(upstream_calls),
+    }
+
+
+def _change(before: Optional[float], after: Optional[float]) -> str:
+    if not before or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def print_report(summary: Dict, baseline: Optional[Dict] = None):
+    print(f"requests       {summary['requests']} ({summary['errors']} errors) in {summary['elapsed_seconds']:.1f}s")
+    columns = ('recorded', 'replayed') + (('baseline',) if baseline else ())
+    print(f"{'':<14} " + ''.join(f'{column:>12}' for column in columns))
+    for name in ('p50', 'p95', 'p99'):
+        values = [summary['latency'][column][name] for column in columns[:2]]
+        if baseline:
+            values.append(baseline['latency']['replayed'][name])
+        change = _change(values[2], values[1]) if baseline else ''
+        print(f"latency {name:<6} " + ''.join(f'{_ms(value):>12}' for value in values) + f'  {change}')
+    for stage in STAGES:
+        values = [summary['llm_calls_per_request'][column][stage] for column in columns[:2]]
+        if baseline:
+            values.append(baseline['llm_calls_per_request']['replayed'][stage])
+        change = _change(values[2], values[1]) if baseline else ''
+        print(f"calls {stage:<8} " + ''.join(f'{value:>12}' for value in values) + f'  {change}')
+    for path in sorted(set(summary['paths']['recorded']) | set(summary['paths']['replayed'])):
+        print(f"path {path:<9} " + ''.join(f"{summary['paths'][column].get(path, 0):>12}"
+                                           for column in columns[:2]))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('traces', nargs='+', help='trace files or TRACE_DIR directories')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay this many times faster than recorded')
+    parser.add_argument('--limit', type=int, default=None, help='replay only the first N requests')
+    parser.add_argument('--concurrency', type=int, default=256, help='most requests in flight at once')
+    parser.add_argument('--detection-latency', default='0.35:0.4', help='median[:sigma] seconds')
+    parser.add_argument('--generation-latency', default='1.5:0.5', help='median[:sigma] seconds')
+    parser.add_argument('--summary-latency', default='2.0:0.5', help='median[:sigma] seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', help='report of an earlier run (--json) to compare against')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.traces)[:args.limit]
+    if not traces:
+        parser.error('no /api/chat traces found')
+
+    from benchmarks.fake_gemini import FakeGeminiBackend, LatencyProfile
+
+    generation = LatencyProfile.parse(args.generation_latency)
+    backend = FakeGeminiBackend(
+        latency={
+            'detection': LatencyProfile.parse(args.detection_latency),
+            'generation': generation,
+            'stream': generation,
+            'summary': LatencyProfile.parse(args.summary_latency),
+        },
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    backend.install()
+    import app
+    app.trace_recorder.directory = None  # Replayed requests must not be traced again
+
+    replay = Replay(app.app, args.speed, args.concurrency, args.seed)
+    elapsed = replay.run(traces)
+    summary = report(replay.results, elapsed, backend.calls)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Cold-start benchmark
+
+Starts fresh interpreters and measures how long it takes to import the app, to answer
+the first health check and to finish warm-up (Gemini client import and model handles).
+No request reaches Gemini: building model handles does not touch the network.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --gunicorn --workers 2
+    python -m benchmarks.startup --max-import-seconds 0.5   # exits 1 on a regression
+
+Exits with status 1 when the import budget is exceeded or when importing the app
+pulls in the Gemini client, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from benchmarks.load_test import _free_port
+
+# Runs in the child interpreter; every time is relative to the child's own start
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/api/health')
+healthy = time.perf_counter()
+app.warmup.ready.wait(120)
+ready = time.perf_counter()
+print(json.dumps({
+    'import_app': imported - started,
+    'first_health': healthy - started,
+    'ready': ready - started,
+}))
+"""
+
+CHILD_IMPORT_CHECK = """
+import json, sys
+import app
+print(json.dumps('google.generativeai' in sys.modules))
+"""
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault('GEMINI_API_KEY', 'startup-benchmark')
+    return env
+
+
+def measure_inprocess(runs: int) -> Dict[str, List[float]]:
+    samples = {'process_to_ready': []}
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', CHILD], capture_output=True, text=True,
+                                env=_child_env(), check=True).stdout
+        total = time.perf_counter() - started
+        result = json.loads(output.strip().splitlines()[-1])
+        for name in ('import_app', 'first_health', 'ready'):
+            samples.setdefault(name, []).append(result[name])
+        samples['process_to_ready'].append(total)
+    return samples
+
+
+def genai_imported_with_app() -> bool:
+    output = subprocess.run([sys.executable, '-c', CHILD_IMPORT_CHECK], capture_output=True, text=True,
+                            env=_child_env(), check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _poll(url: str, deadline: float, process: subprocess.Popen) -> Optional[float]:
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return time.perf_counter()
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.02)
+    return None
+
+
+def measure_gunicorn(runs: int, workers: int) -> Dict[str, List[float]]:
+    samples = {'first_health': [], 'ready': []}
+    for _ in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--workers', str(workers),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+            env=_child_env()
+        )
+        try:
+            deadline = started + 120
+            healthy = _poll(f'http://127.0.0.1:{port}/api/health', deadline, process)
+            ready = _poll(f'http://127.0.0.1:{port}/api/health/ready', deadline, process)
+            if healthy is None or ready is None:
+                raise RuntimeError('gunicorn did not become ready in time')
+            samples['first_health'].append(healthy - started)
+            samples['ready'].append(ready - started)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return samples
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help='also time a gunicorn master with workers')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-import-seconds', type=float, default=None,
+                        help='fail when the median app import takes longer')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = {'inprocess': {name: statistics.median(values)
+                            for name, values in measure_inprocess(args.runs).items()}}
+    report['genai_imported_with_app'] = genai_imported_with_app()
+    if args.gunicorn:
+        report['gunicorn'] = {name: statistics.median(values)
+                              for name, values in measure_gunicorn(args.runs, args.workers).items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for mode in ('inprocess', 'gunicorn'):
+            for name, seconds in report.get(mode, {}).items():
+                print(f"{mode:<10} {name:<17} {seconds * 1000:.0f}ms (median of {args.runs})")
+        print(f"Gemini client imported with the app: {report['genai_imported_with_app']}")
+
+    failures = []
+    if report['genai_imported_with_app']:
+        failures.append('importing the app pulls in google.generativeai')
+    if args.max_import_seconds is not None and report['inprocess']['import_app'] > args.max_import_seconds:
+        failures.append(f"app import took {report['inprocess']['import_app']:.3f}s, "
+                        f"budget is {args.max_import_seconds:.3f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
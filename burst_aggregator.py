@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict
+
+from chat_pipeline import ChatPipeline
+from config import Config
+from keyword_matcher import keyword_matcher
+from metrics import metrics
+from resilience import CallSupersededError, request_deadline, supersedable
+from session_store import SessionStore
+
+# Returned to a request whose message was merged into a later one; that request answers both
+SUPERSEDED_PAYLOAD = {
+    'response': None,
+    'superseded': True,
+    'escalate': False
+}
+
+
+class _Burst:
+    """Messages of one session not yet answered by a completed turn"""
+
+    def __init__(self):
+        self.fragments = []
+        self.version = 0
+        self.requests = 0
+        # Resolved to abandon the turn in flight for the fragments so far
+        self.in_flight = None
+        self.changed = threading.Condition()
+
+
+class BurstAggregator:
+    """Answers the messages a session sends in quick succession as one merged turn
+
+    Each message waits out the quiet window. When another message of the session
+    arrives in the meantime, the earlier request returns SUPERSEDED_PAYLOAD and the
+    latest one answers the merged text, with a single detection and generation. A turn
+    already in flight for earlier fragments is abandoned and its history change dropped.
+    Messages with escalation or crisis keywords do not wait: they are answered at once,
+    together with any fragments still pending.
+    """
+
+    def __init__(self, pipeline: ChatPipeline, store: SessionStore,
+                 quiet_seconds: float = Config.BURST_QUIET_SECONDS):
+        self.pipeline = pipeline
+        self.store = store
+        self.quiet_seconds = quiet_seconds
+        self._bursts: Dict[str, _Burst] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, session_id: str, user_message: str) -> Dict:
+        """Return the payload for this message, or SUPERSEDED_PAYLOAD once a later one took it over"""
+        urgent = self.pipeline.short_circuits(keyword_matcher.scan(user_message))
+        with self._lock:
+            burst = self._bursts.setdefault(session_id, _Burst())
+            burst.requests += 1
+        try:
+            return self._handle(session_id, burst, user_message, urgent)
+        finally:
+            with self._lock:
+                burst.requests -= 1
+                if burst.requests == 0 and not burst.fragments:
+                    del self._bursts[session_id]
+
+    def _handle(self, session_id: str, burst: _Burst, user_message: str, urgent: bool) -> Dict:
+        with burst.changed:
+            burst.fragments.append(user_message)
+            burst.version += 1
+            version = burst.version
+            if burst.in_flight is not None:
+                burst.in_flight.set_result(None)
+                burst.in_flight = None
+            burst.changed.notify_all()
+
+            if not urgent:
+                quiet_until = time.monotonic() + self.quiet_seconds
+                while burst.version == version and time.monotonic() < quiet_until:
+                    burst.changed.wait(quiet_until - time.monotonic())
+            if burst.version != version:
+                return self._superseded()
+            fragments = list(burst.fragments)
+            in_flight = burst.in_flight = Future()
+
+        state = self.store.load(session_id)
+        try:
+            with request_deadline(), supersedable(in_flight):
+                payload = self.pipeline.handle(state, '\n'.join(fragments))
+        except CallSupersededError:
+            return self._superseded()
+        except Exception:
+            # Drop the fragments with the failed turn, as a turn without aggregation would
+            with burst.changed:
+                if not in_flight.done():
+                    burst.in_flight = None
+                    del burst.fragments[:len(fragments)]
+            raise
+
+        with burst.changed:
+            # Saved under the lock, so a newer fragment either supersedes this turn or
+            # is answered on top of the state it saved
+            if in_flight.done():
+                return self._superseded()
+            burst.in_flight = None
+            del burst.fragments[:len(fragments)]
+            self.store.save(session_id, state)
+        self.pipeline.memory.schedule_summary(self.store, session_id, state)
+        return payload
+
+    @staticmethod
+    def _superseded() -> Dict:
+        metrics.inc('alem_responses_total', path='superseded')
+        return dict(SUPERSEDED_PAYLOAD)
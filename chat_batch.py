@@ -0,0 +1,105 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from chat_pipeline import ChatPipeline
+from config import Config
+from metrics import metrics
+from resilience import request_deadline
+from session_store import SessionStore
+
+FALLBACK_PAYLOAD = {
+    'response': 'I hear you. Would you like to share more?',
+    'escalate': False,
+    'language_settled': False
+}
+
+
+class BatchChat:
+    """Runs the chat pipeline for many (session_id, message) items at once
+
+    Sessions run concurrently on a bounded pool, while the messages of one session run
+    in order. Languages still to be detected are detected together up front, so the
+    batch needs as few detection calls as possible. Bridge sessions are stored under
+    their own key prefix, apart from the cookie sessions of the web client.
+    """
+
+    KEY_PREFIX = 'bridge:'
+
+    def __init__(self, pipeline: ChatPipeline, store: SessionStore,
+                 max_parallelism: int = Config.BATCH_MAX_PARALLELISM):
+        self.pipeline = pipeline
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_parallelism, thread_name_prefix='chat-batch')
+
+    def run(self, items: List[Dict]) -> List[Dict]:
+        """Return one result per item, in input order"""
+        results = [None] * len(items)
+        sessions = {}
+        for index, item in enumerate(items):
+            session_id = item.get('session_id')
+            message = item.get('message')
+            if not isinstance(session_id, str) or not session_id or not isinstance(message, str):
+                results[index] = {'error': 'session_id and message are required'}
+                continue
+            message = message.strip()
+            if not message:
+                results[index] = {
+                    'session_id': session_id,
+                    'response': Config.INITIAL_GREETING,
+                    'escalate': False,
+                    'language_settled': False
+                }
+                continue
+            sessions.setdefault(session_id, []).append((index, message))
+
+        states = {session_id: self.store.load(self.KEY_PREFIX + session_id) for session_id in sessions}
+        detected = self._detect_languages(sessions, states)
+
+        futures = [
+            self._executor.submit(self._run_session, session_id, states[session_id], turns, detected)
+            for session_id, turns in sessions.items()
+        ]
+        for future in futures:
+            for index, payload in future.result():
+                results[index] = payload
+        return results
+
+    def _detect_languages(self, sessions: Dict, states: Dict) -> Dict[int, str]:
+        """Detect every message whose turn would detect its language, in one coalesced pass"""
+        pending = [
+            (index, message)
+            for session_id, turns in sessions.items()
+            for index, message in turns
+            if self.pipeline.needs_detection(states[session_id], message)
+        ]
+        if not pending:
+            return {}
+        try:
+            with request_deadline(), metrics.stage('detection'):
+                languages = self.pipeline.models.backend_for('detection').detect_languages(
+                    [message for _, message in pending])
+        except Exception as e:
+            # Upstream failures already come back as local guesses, so this is a bug in the
+            # batching itself; the turns are still served, each detecting its own language
+            logging.error(f"Error detecting batch languages: {str(e)}")
+            metrics.inc('alem_errors_total', where='detection')
+            return {}
+        return {index: language for (index, _), language in zip(pending, languages)}
+
+    def _run_session(self, session_id: str, state: Dict, turns: List, detected: Dict[int, str]) -> List:
+        key = self.KEY_PREFIX + session_id
+        results = []
+        for index, message in turns:
+            try:
+                with request_deadline():
+                    payload = self.pipeline.handle(state, message, detected.get(index))
+                self.store.save(key, state)
+            except Exception as e:
+                logging.error(f"Error handling batch chat item: {str(e)}")
+                metrics.inc('alem_errors_total', where='batch')
+                payload = dict(FALLBACK_PAYLOAD)
+                state = self.store.load(key)  # Drop the half-applied turn
+            results.append((index, dict(payload, session_id=session_id)))
+        self.pipeline.memory.schedule_summary(self.store, key, state)
+        return results
@@ -0,0 +1,278 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from config import Config
+from conversation_memory import ConversationMemory
+from gemini_integration import GeminiChat
+from keyword_matcher import KeywordHits, keyword_matcher
+from language_detection import LanguageDetector
+from metrics import metrics
+from model_backends import ModelRouter, build_backends
+
+
+# Conversation state kept between turns, whatever the transport stores it in
+STATE_KEYS = ('conversation_history', 'history_tokens', 'summary', 'summary_pending', 'summary_folded',
+              'memory_epoch', 'message_count', 'language', 'language_settled', 'detected_languages')
+
+
+class Turn:
+    """Outcome of preparing a user message, before any response generation"""
+
+    def __init__(self, message: str, language: Optional[str], language_settled: bool,
+                 hits: KeywordHits, response: Optional[str] = None, escalate: bool = False):
+        self.message = message
+        self.language = language
+        self.language_settled = language_settled
+        self.hits = hits
+        # Set when the turn was answered without generation (handover or crisis)
+        self.response = response
+        self.escalate = escalate
+
+    def payload(self, response: str) -> Dict:
+        if self.escalate:
+            return {
+                'response': response,
+                'escalate': True,
+                'language_settled': self.language_settled
+            }
+        return {
+            'response': response,
+            'escalate': False,
+            'language_settled': self.language_settled,
+            'current_language': self.language
+        }
+
+
+class ChatPipeline:
+    """Escalation, crisis, language detection and generation for one conversation turn
+
+    Operates on a plain state dict so the same logic serves every transport. Detection
+    and generation run on the model backend the router picks for them.
+    """
+
+    def __init__(self, gemini_chat: GeminiChat, language_detector: LanguageDetector,
+                 models: Optional[ModelRouter] = None):
+        self.gemini_chat = gemini_chat
+        self.language_detector = language_detector
+        self.memory = ConversationMemory(gemini_chat.summarize)
+        self.models = models or ModelRouter(build_backends(gemini_chat, language_detector))
+
+    def prepare_turn(self, state: Dict, user_message: str, detected_language: Optional[str] = None) -> Turn:
+        """Record the user message, short-circuit escalation and crisis, and settle the language
+
+        A detected_language already known for the message (e.g. from a batched detection)
+        saves the detection call.
+        """
+        turn = self._start_turn(state, user_message)
+        if turn.response is None and not turn.language_settled:
+            if detected_language is None:
+                with metrics.stage('detection'):
+                    detected_language = self.models.backend_for('detection').detect_language(user_message)
+            self._settle_language(state, turn, detected_language)
+        return turn
+
+    def _start_turn(self, state: Dict, user_message: str) -> Turn:
+        # Get or initialize session data
+        if 'conversation_history' not in state:
+            state['conversation_history'] = []
+            state['language'] = None
+            state['language_settled'] = False
+            state['detected_languages'] = []
+
+        current_language = state.get('language')
+        language_settled = state.get('language_settled', False)
+
+        # Add user message to conversation history
+        self.memory.add(state, user_message)
+
+        # One scan covers escalation and crisis keywords of every language, so both
+        # short-circuit before any LLM call, even while the language is unsettled
+        with metrics.stage('keyword_scan'):
+            hits = keyword_matcher.scan(user_message)
+
+        # Check for escalation keywords
+        if self.check_escalation(hits):
+            metrics.inc('alem_responses_total', path='escalation')
+            response = Config.HANDOVER_MESSAGES[hits.language_for('escalation', current_language)]
+            # Clear conversation history for privacy
+            for key in STATE_KEYS:
+                state.pop(key, None)
+            return Turn(user_message, current_language, language_settled, hits,
+                        response=response, escalate=True)
+
+        crisis_category = 'immediate_danger' if 'immediate_danger' in hits else 'suicidal'
+        crisis_language = hits.language_for(crisis_category, current_language)
+        if crisis_language:
+            response = self.gemini_chat.crisis_response(user_message, crisis_language, hits)
+            turn = Turn(user_message, current_language or crisis_language, language_settled, hits,
+                        response=response)
+            self.complete_turn(state, response)
+            return turn
+
+        return Turn(user_message, current_language, language_settled, hits)
+
+    def _settle_language(self, state: Dict, turn: Turn, detected_language: str):
+        with metrics.stage('language_settle'):
+            detected_languages = self.language_detector.record_detection(
+                state.get('detected_languages', []),
+                detected_language
+            )
+            state['detected_languages'] = detected_languages
+
+            # Check if language is consistently used
+            settled_language = self.language_detector.is_language_settled(detected_languages)
+
+        if settled_language:
+            turn.language = settled_language
+            turn.language_settled = True
+            state['language'] = settled_language
+            state['language_settled'] = True
+        else:
+            # Use detected language for this response, but don't settle yet
+            turn.language = detected_language
+
+    def needs_detection(self, state: Dict, user_message: str) -> bool:
+        """Whether a turn for this message would detect its language, judged without changing state"""
+        if state.get('language_settled'):
+            return False
+        return not self.short_circuits(keyword_matcher.scan(user_message))
+
+    def short_circuits(self, hits: KeywordHits) -> bool:
+        """Whether escalation or crisis keywords answer the message without generation"""
+        return bool(self.check_escalation(hits) or hits.get('immediate_danger') or hits.get('suicidal'))
+
+    def check_escalation(self, hits: KeywordHits) -> bool:
+        """Check if the scanned message contains escalation keywords in any language"""
+        return bool(hits.get('escalation'))
+
+    def complete_turn(self, state: Dict, bot_response: str):
+        """Update conversation history with the bot response"""
+        self.memory.add(state, bot_response)
+
+    def handle(self, state: Dict, user_message: str, detected_language: Optional[str] = None) -> Dict:
+        """Run a whole turn and return the response payload"""
+        turn = self.prepare_turn(state, user_message, detected_language)
+        if turn.response is not None:
+            return turn.payload(turn.response)
+
+        # Generate empathetic response
+        summary, conversation_history = self.memory.context(state)
+        with metrics.stage('generation'):
+            bot_response = self.models.backend_for('generation').generate_reply(
+                user_message,
+                turn.language,
+                conversation_history,
+                turn.hits,
+                summary,
+                self.memory.student_messages(state)
+            )
+        self.complete_turn(state, bot_response)
+        return turn.payload(bot_response)
+
+    async def handle_async(self, state: Dict, user_message: str) -> Dict:
+        """Run a whole turn without blocking, overlapping detection with generation
+
+        While the language is unsettled and cannot be resolved locally, generation starts
+        speculatively in the session's last known language alongside the Gemini detection
+        call, and is only redone when detection disagrees.
+        """
+        turn = self._start_turn(state, user_message)
+        if turn.response is not None:
+            return turn.payload(turn.response)
+
+        summary, conversation_history = self.memory.context(state)
+        backend = self.models.backend_for('generation')
+        generation = None
+        if not turn.language_settled:
+            detected_language, local_guess = self.language_detector.detect_language_locally(user_message)
+            if detected_language is None:
+                recent = state.get('detected_languages') or []
+                speculative_language = (recent[-1] if recent else None) or local_guess or Config.DEFAULT_LANGUAGE
+                generation = asyncio.ensure_future(backend.generate_reply_async(
+                    user_message, speculative_language, list(conversation_history), turn.hits, summary,
+                    self.memory.student_messages(state)))
+                try:
+                    with metrics.stage('detection'):
+                        detected_language = await self.models.backend_for('detection').detect_language_async(
+                            user_message)
+                except BaseException:
+                    generation.cancel()
+                    raise
+                if detected_language != speculative_language:
+                    generation.cancel()
+                    generation = None
+            self._settle_language(state, turn, detected_language)
+
+        if generation is None:
+            generation = backend.generate_reply_async(
+                user_message, turn.language, conversation_history, turn.hits, summary,
+                self.memory.student_messages(state))
+        with metrics.stage('generation'):
+            bot_response = await generation
+
+        self.complete_turn(state, bot_response)
+        return turn.payload(bot_response)
+
+    async def prepare_turn_async(self, state: Dict, user_message: str) -> Turn:
+        """prepare_turn, awaiting the detection call"""
+        turn = self._start_turn(state, user_message)
+        if turn.response is None and not turn.language_settled:
+            with metrics.stage('detection'):
+                detected_language = await self.models.backend_for('detection').detect_language_async(user_message)
+            self._settle_language(state, turn, detected_language)
+        return turn
+
+    def stream(self, state: Dict, turn: Turn) -> Iterator[Tuple[str, Dict]]:
+        """Generate the response for a prepared turn as (event, data) pairs
+
+        A short-circuited turn is a single 'message' event carrying the full payload.
+        Otherwise 'token' and 'resources' events are followed by 'done'; 'fallback'
+        replaces the text streamed so far. History is updated once the stream completes.
+        """
+        if turn.response is not None:
+            yield 'message', turn.payload(turn.response)
+            return
+
+        bot_response = ""
+        summary, conversation_history = self.memory.context(state)
+        for event, text in self.models.backend_for('generation').generate_reply_stream(
+                turn.message, turn.language, conversation_history, turn.hits, summary,
+                self.memory.student_messages(state)):
+            if event == 'crisis':
+                bot_response = text
+                yield 'message', turn.payload(text)
+                self.complete_turn(state, bot_response)
+                return
+            if event == 'fallback':
+                bot_response = text
+            else:
+                bot_response += text
+            yield event, {'text': text}
+
+        self.complete_turn(state, bot_response)
+        yield 'done', turn.payload(bot_response)
+
+    async def stream_async(self, state: Dict, turn: Turn) -> AsyncIterator[Tuple[str, Dict]]:
+        """Same events as stream, awaiting Gemini instead of blocking the worker"""
+        if turn.response is not None:
+            yield 'message', turn.payload(turn.response)
+            return
+
+        bot_response = ""
+        summary, conversation_history = self.memory.context(state)
+        async for event, text in self.models.backend_for('generation').generate_reply_stream_async(
+                turn.message, turn.language, conversation_history, turn.hits, summary,
+                self.memory.student_messages(state)):
+            if event == 'crisis':
+                bot_response = text
+                yield 'message', turn.payload(text)
+                self.complete_turn(state, bot_response)
+                return
+            if event == 'fallback':
+                bot_response = text
+            else:
+                bot_response += text
+            yield event, {'text': text}
+
+        self.complete_turn(state, bot_response)
+        yield 'done', turn.payload(bot_response)
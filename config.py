@@ -7,6 +7,96 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    GEMINI_MODEL = 'gemini-2.5-flash'
+
+    # Lifetime of the explicit context cache holding each language's system prompt; 0 disables it
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL_SECONDS', 0))
+
+    # Latency budgets for Gemini calls: a deadline for the whole request, a timeout per stage,
+    # a hedged duplicate call once a call runs past the stage's p95, and a circuit breaker
+    # that serves the canned fallback and crisis responses while Gemini keeps failing
+    LLM_REQUEST_DEADLINE_SECONDS = float(os.environ.get('LLM_REQUEST_DEADLINE_SECONDS', 20))
+    LLM_STAGE_TIMEOUTS = {
+        'detection': 4.0,
+        'generation': 15.0,
+        'stream': 8.0,  # Until the first streamed chunk
+        'summary': 30.0,
+    }
+    LLM_HEDGE_STAGES = ('detection', 'generation', 'stream')
+    LLM_HEDGE_MIN_DELAY_SECONDS = 1.0
+    LLM_HEDGE_MIN_SAMPLES = 20
+    # Identical in-flight calls (same model, prompt and language) share one upstream call;
+    # detection results also stay shared for this many seconds after the call finished
+    LLM_SINGLE_FLIGHT_WINDOWS = {'detection': 2.0}
+    LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('LLM_CIRCUIT_FAILURE_THRESHOLD', 5))
+    LLM_CIRCUIT_RESET_SECONDS = float(os.environ.get('LLM_CIRCUIT_RESET_SECONDS', 30))
+
+    # Process-wide LLM gateway: concurrent upstream calls, queued calls before load is shed
+    # with the canned fallback, and a token-bucket rate limit (0 disables it)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 16))
+    LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', 200))
+    LLM_RATE_LIMIT_PER_SECOND = float(os.environ.get('LLM_RATE_LIMIT_PER_SECOND', 0))
+    LLM_RATE_LIMIT_BURST = int(os.environ.get('LLM_RATE_LIMIT_BURST', 10))
+
+    # Server-side session storage; the cookie only carries an opaque session ID.
+    # 'memory' is per process, 'sqlite' is shared by all gunicorn workers on the host;
+    # gunicorn.conf.py defaults to 'sqlite' with several workers and refuses 'memory' there.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+    SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', 'sessions.db')
+    SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', 2 * 60 * 60))
+    SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', 10000))
+
+    # Per-process metrics are written to this directory so /api/metrics can merge the
+    # gunicorn workers; unset, each process only reports its own
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+    # Batch endpoint for messaging bridges; disabled unless a bearer token is configured
+    BATCH_API_TOKEN = os.environ.get('BATCH_API_TOKEN')
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+    BATCH_MAX_PARALLELISM = int(os.environ.get('BATCH_MAX_PARALLELISM', 8))
+
+    # WebSocket conversations (asgi.py) are closed after this long without a message
+    WEBSOCKET_IDLE_TIMEOUT_SECONDS = float(os.environ.get('WEBSOCKET_IDLE_TIMEOUT_SECONDS', 15 * 60))
+
+    # Model backend serving each stage: 'gemini'; 'llama_cpp' for a small quantized model
+    # run on the worker's CPU, available once LOCAL_MODEL_PATH is set; or 'local' for the
+    # CPU-only canned backend (local n-gram detection, short supportive replies chosen by
+    # topic). While the configured backend is unhealthy (Gemini's circuit open, gateway
+    # queue full) the stage runs on its fallback backend instead; None keeps it on the
+    # configured one (set the variable empty).
+    MODEL_BACKENDS = {
+        'detection': os.environ.get('DETECTION_BACKEND', 'gemini'),
+        'generation': os.environ.get('GENERATION_BACKEND', 'gemini'),
+    }
+    MODEL_FALLBACK_BACKENDS = {
+        'detection': os.environ.get('DETECTION_FALLBACK_BACKEND', 'local') or None,
+        'generation': os.environ.get('GENERATION_FALLBACK_BACKEND', 'local') or None,
+    }
+
+    # GGUF model file for the llama_cpp backend (needs llama-cpp-python), e.g. a 4-bit
+    # quantized 1-3B instruction model; loaded once per worker process on first use
+    LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH')
+    LOCAL_MODEL_CONTEXT_TOKENS = int(os.environ.get('LOCAL_MODEL_CONTEXT_TOKENS', 4096))
+    LOCAL_MODEL_THREADS = int(os.environ['LOCAL_MODEL_THREADS']) if os.environ.get('LOCAL_MODEL_THREADS') else None
+    LOCAL_MODEL_MAX_TOKENS = int(os.environ.get('LOCAL_MODEL_MAX_TOKENS', 256))
+
+    # Content-free traces of /api/chat requests (timings, paths, token counts) are appended
+    # to files in this directory for benchmarks/replay.py; unset, nothing is recorded
+    TRACE_DIR = os.environ.get('TRACE_DIR')
+
+    # Per-request cProfile dumps for staging, written to PROFILE_DIR as <request id>.prof.
+    # Requests are profiled when they send an X-Profile header equal to PROFILE_TOKEN, or at
+    # random at PROFILE_SAMPLE_RATE. This covers the Flask routes and, under asgi.py, the async
+    # /api/chat. Without PROFILE_DIR the middleware is not installed.
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+    # Messages a session sends within this many seconds of each other are answered as one
+    # merged turn on /api/chat (0 disables it). Bursts are tracked per process, so the
+    # requests of a session must reach the same worker.
+    BURST_QUIET_SECONDS = float(os.environ.get('BURST_QUIET_SECONDS', 0))
 
     # Supported languages with codes and names
     SUPPORTED_LANGUAGES = {
@@ -27,6 +117,62 @@ class Config:
     Text: "{text}"
     """
 
+    LANGUAGE_DETECTION_BATCH_PROMPT = """
+    Determine the language of each numbered text below.
+    Respond ONLY with a JSON array holding one language code per text, in the same order:
+    'en' for English, 'am' for Amharic, 'om' for Oromifa, or 'ti' for Tigrigna.
+    If uncertain about a text, use 'en' for it.
+
+    {texts}
+    """
+    # Most texts sent to Gemini in one batched detection call
+    LANGUAGE_DETECTION_BATCH_SIZE = 50
+
+    # Local script/n-gram detection is trusted at or above this confidence; below it Gemini decides
+    LOCAL_DETECTION_CONFIDENCE_THRESHOLD = float(os.environ.get('LOCAL_DETECTION_CONFIDENCE_THRESHOLD', 0.9))
+
+    # The language is settled once the last user messages, at least LANGUAGE_SETTLE_MIN_MESSAGES
+    # and up to LANGUAGE_SETTLE_WINDOW of them, were all detected in it
+    LANGUAGE_SETTLE_WINDOW = 3
+    LANGUAGE_SETTLE_MIN_MESSAGES = 2
+
+    # Maximum number of detection results memoized per process
+    LANGUAGE_DETECTION_CACHE_SIZE = int(os.environ.get('LANGUAGE_DETECTION_CACHE_SIZE', 4096))
+
+    # Approximate token budget for the verbatim history sent with each turn; older
+    # exchanges are folded into a running summary instead of being dropped
+    MEMORY_HISTORY_TOKEN_BUDGET = int(os.environ.get('MEMORY_HISTORY_TOKEN_BUDGET', 600))
+    # Most messages kept waiting for the summary, should summarization keep failing
+    MEMORY_SUMMARY_PENDING_LIMIT = int(os.environ.get('MEMORY_SUMMARY_PENDING_LIMIT', 40))
+
+    # Generation settings by conversation stage: the first exchanges get short, focused
+    # replies, high distress a steadier tone and more room, established rapport the most.
+    # gemini-2.5-flash counts its internal reasoning against max_output_tokens and the
+    # pinned client cannot set a thinking budget, so the caps leave headroom for it.
+    # max_output_tokens is the only stop condition: the history goes out as structured
+    # turns, so the model ends its own turn and there is no speaker label to stop on.
+    # The stage follows the student messages of the whole conversation, folded ones included.
+    GENERATION_PROFILES = {
+        'first_contact': {'max_output_tokens': 768, 'temperature': 0.6},
+        'established': {'max_output_tokens': 1536, 'temperature': 0.8},
+        'high_distress': {'max_output_tokens': 1024, 'temperature': 0.3},
+    }
+    # Student messages that still count as first contact
+    FIRST_CONTACT_MESSAGES = 2
+
+    CONVERSATION_SUMMARY_PROMPT = """
+    You maintain confidential notes for a trauma-informed counselor.
+    Update the summary below with the new exchanges. Keep what matters for continuing
+    support: feelings expressed, safety concerns, what help was offered or accepted.
+    Write in English, at most {max_words} words, no names or identifying details.
+
+    Current summary: {summary}
+
+    New exchanges:
+    {exchanges}
+    """
+    CONVERSATION_SUMMARY_MAX_WORDS = 80
+
     # Initial greeting that prompts for language naturally
     INITIAL_GREETING = "Hello! I'm here to support you. Please feel free to speak in whichever language you're most comfortable with."
 
@@ -38,6 +184,28 @@ class Config:
         'ti': ['ሓገዝ', 'ኣደጋ', 'ሰብ ክዛረብ', 'እገዳይ', 'ወኪል']
     }
 
+    # Crisis keywords; matched as substrings so that inflected forms still count
+    SAFETY_KEYWORDS = {
+        'immediate_danger': {
+            'en': ['help me now', 'emergency', 'he is here', 'someone is', 'right now', 'happening now'],
+            'am': ['አሁን ረዱኝ', 'አደገኛ', 'እሱ እዚህ ነው', 'አንድ ሰው', 'አሁን ነው', 'አሁን እየሆነ'],
+            'om': ['amma na gargaari', 'balaa', 'inni asan jira', 'namni tokko', 'ammuma', 'amma ta\'aa jira'],
+            'ti': ['ሕጂ ሓግዙኒ', 'ሓደጋ', 'ንሱ ኣብዚ ኣሎ', 'ሓደ ሰብ', 'ሕጂ', 'ሕጂ ይፍጸም ኣሎ']
+        },
+        'suicidal': {
+            'en': ['want to die', 'kill myself', 'end it all', 'no point living', 'better off dead'],
+            'am': ['መሞት እፈልጋለሁ', 'ራሴን መግደል', 'ሁሉንም ማጥፋት', 'የመኖር ፋይዳ የለም', 'መሞት ይሻላል'],
+            'om': ['du\'uu barbaada', 'of ajjeesuu', 'hunda dhaabuu', 'jiraachuun faayidaa hin qabu',
+                   'du\'uun wayya'],
+            'ti': ['ክሞት እደሊ', 'ራሰይ ምቅታል', 'ኩሉ ምውዳእ', 'ምንባር ረብሓ የብሉን', 'ምሞት ይሓይሽ']
+        }
+    }
+
+    # Phrases that indicate high distress without an immediate crisis
+    DISTRESS_PHRASES = {
+        'en': ['can\'t take it', 'too much', 'exhausted']
+    }
+
     # Safehouse handover messages
     HANDOVER_MESSAGES = {
         'en': "I'm connecting you with a safehouse representative who can provide further support. Please wait a moment.",
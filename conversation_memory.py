@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from metrics import metrics
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: ~4 Latin characters per token, ~1 token per Ethiopic syllable"""
+    ethiopic = sum(1 for char in text if 'ሀ' <= char <= '᎟')
+    return max(1, ethiopic + (len(text) - ethiopic + 3) // 4)
+
+
+class ConversationMemory:
+    """Token-budgeted conversation history with a rolling summary of older turns
+
+    Recent turns are kept verbatim while they fit in the history budget. Older exchanges
+    are folded out into 'summary_pending' and merged into a compact running summary by
+    a background job, so summarization never adds latency to a turn. Every conversation
+    gets a 'memory_epoch' token, so a summary started before a wipe is never written
+    into the conversation that follows it.
+    """
+
+    def __init__(self, summarizer: Callable[[str, List[str]], str],
+                 history_token_budget: int = Config.MEMORY_HISTORY_TOKEN_BUDGET,
+                 pending_limit: int = Config.MEMORY_SUMMARY_PENDING_LIMIT):
+        self.summarizer = summarizer
+        self.history_token_budget = history_token_budget
+        self.pending_limit = pending_limit
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='memory-summary')
+        self._scheduled = set()
+        self._scheduled_lock = threading.Lock()
+
+    def add(self, state: Dict, text: str):
+        """Append a message to the history and fold older exchanges out of the budget"""
+        state.setdefault('memory_epoch', uuid.uuid4().hex)
+        history = state.setdefault('conversation_history', [])
+        tokens = state.get('history_tokens') or []
+        if len(tokens) != len(history):
+            tokens = [estimate_tokens(message) for message in history]
+        # Every message of the conversation, including those folded out of the budget
+        state['message_count'] = state.get('message_count', len(history) + state.get('summary_folded', 0)) + 1
+
+        history.append(text)
+        tokens.append(estimate_tokens(text))
+
+        # Fold whole exchanges so the history keeps opening with a student message,
+        # and never fold the latest message even if it alone exceeds the budget
+        pending = state.get('summary_pending') or []
+        folded = state.get('summary_folded', len(pending))
+        while sum(tokens) > self.history_token_budget and len(history) > 2:
+            pending.extend(history[:2])
+            del history[:2]
+            del tokens[:2]
+            folded += 2
+        # While summarization keeps failing, the oldest pending exchanges are given up on
+        if len(pending) > self.pending_limit:
+            del pending[:len(pending) - self.pending_limit]
+
+        state['history_tokens'] = tokens
+        if pending:
+            state['summary_pending'] = pending
+            state['summary_folded'] = folded
+
+    def context(self, state: Dict) -> Tuple[Optional[str], List[str]]:
+        """Return the running summary and the verbatim history to build the prompt from"""
+        return state.get('summary') or None, state.get('conversation_history', [])
+
+    @staticmethod
+    def student_messages(state: Dict) -> int:
+        """Student messages so far in the conversation, the current one included"""
+        # Messages alternate student/Alem, starting with the student
+        return (state.get('message_count', len(state.get('conversation_history', []))) + 1) // 2
+
+    def schedule_summary(self, store, session_id: str, state: Dict):
+        """Fold pending turns into the summary in the background, once per session at a time"""
+        if not state.get('summary_pending'):
+            return
+        with self._scheduled_lock:
+            if session_id in self._scheduled:
+                return
+            self._scheduled.add(session_id)
+        self._executor.submit(self._refresh_summary, store, session_id)
+
+    async def refresh_summary_async(self, state: Dict):
+        """Fold pending turns into the summary of a state held in memory by the caller
+
+        Gemini is called on a worker thread; the state itself is only touched on the
+        caller's event loop.
+        """
+        pending = state.get('summary_pending')
+        if not pending:
+            return
+        epoch, folded = state.get('memory_epoch'), state.get('summary_folded', len(pending))
+        try:
+            summary = await asyncio.to_thread(self.summarizer, state.get('summary') or '', list(pending))
+        except Exception as e:
+            logging.error(f"Error refreshing conversation summary: {str(e)}")
+            metrics.inc('alem_errors_total', where='summary')
+            return
+        # A wipe (handover) starts a new epoch, and the old summary must not come back
+        if summary and state.get('memory_epoch') == epoch:
+            self._apply_summary(state, summary, folded)
+
+    @staticmethod
+    def _apply_summary(state: Dict, summary: str, folded: int):
+        """Store a summary covering everything folded out up to the `folded`-th message"""
+        state['summary'] = summary
+        pending = state.get('summary_pending', [])
+        # Only messages folded out after the summarized ones are still pending
+        newer = state.get('summary_folded', len(pending)) - folded
+        remaining = pending[max(0, len(pending) - newer):] if newer > 0 else []
+        if remaining:
+            state['summary_pending'] = remaining
+        else:
+            state.pop('summary_pending', None)
+
+    def _refresh_summary(self, store, session_id: str):
+        try:
+            state = store.get(session_id)
+            if not state or not state.get('summary_pending'):
+                return
+            pending = state['summary_pending']
+            epoch, folded = state.get('memory_epoch'), state.get('summary_folded', len(pending))
+            summary = self.summarizer(state.get('summary') or '', pending)
+            if not summary:
+                return
+
+            # Re-read so turns that completed while summarizing are kept
+            latest = store.get(session_id)
+            if not latest or latest.get('memory_epoch') != epoch:
+                return  # Session was wiped (handover) or expired meanwhile
+            self._apply_summary(latest, summary, folded)
+            store.save(session_id, latest)
+        except Exception as e:
+            logging.error(f"Error refreshing conversation summary: {str(e)}")
+            metrics.inc('alem_errors_total', where='summary')
+        finally:
+            with self._scheduled_lock:
+                self._scheduled.discard(session_id)
@@ -1,14 +1,28 @@
-import google.generativeai as genai
 from config import Config
+from keyword_matcher import KeywordHits, keyword_matcher
+from llm_gateway import PRIORITY_CRISIS, PRIORITY_GENERATION, llm_gateway
+from local_replies import LocalReplies
+from metrics import metrics
+from resilience import CallSupersededError
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime
+import threading
+import time
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
 
 
 class GeminiChat:
+    # Static per-turn guidance; part of the system instruction so it is sent (and cached) once
+    RESPONSE_REQUIREMENTS = """
+            RESPONSE REQUIREMENTS:
+            1. Start with emotional validation
+            2. Use culturally appropriate expressions of care
+            3. Maintain hope and empowerment focus
+            4. End with gentle support statement
+            5. Keep response length appropriate (2-4 sentences for initial contact, longer for established rapport)
+            """
+
     def __init__(self):
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
 
         # Enhanced system prompt templates with comprehensive trauma-informed approach
         self.system_prompts = {
@@ -150,22 +164,18 @@ class GeminiChat:
             """
         }
 
+        # One model handle per language with its system prompt as system_instruction,
+        # so the prompt is no longer re-sent inside every request's contents. They are
+        # built on first use or by warm_up, keeping the client import out of startup
+        self._models = {}
+        self._models_expire_at = {}
+        self._models_lock = threading.Lock()
+
         # Enhanced safety keywords detection
-        self.safety_keywords = {
-            'immediate_danger': {
-                'en': ['help me now', 'emergency', 'he is here', 'someone is', 'right now', 'happening now'],
-                'am': ['አሁን ረዱኝ', 'አደገኛ', 'እሱ እዚህ ነው', 'አንድ ሰው', 'አሁን ነው', 'አሁን እየሆነ'],
-                'om': ['amma na gargaari', 'balaa', 'inni asan jira', 'namni tokko', 'ammuma', 'amma ta\'aa jira'],
-                'ti': ['ሕጂ ሓግዙኒ', 'ሓደጋ', 'ንሱ ኣብዚ ኣሎ', 'ሓደ ሰብ', 'ሕጂ', 'ሕጂ ይፍጸም ኣሎ']
-            },
-            'suicidal': {
-                'en': ['want to die', 'kill myself', 'end it all', 'no point living', 'better off dead'],
-                'am': ['መሞት እፈልጋለሁ', 'ራሴን መግደል', 'ሁሉንም ማጥፋት', 'የመኖር ፋይዳ የለም', 'መሞት ይሻላል'],
-                'om': ['du\'uu barbaada', 'of ajjeesuu', 'hunda dhaabuu', 'jiraachuun faayidaa hin qabu',
-                       'du\'uun wayya'],
-                'ti': ['ክሞት እደሊ', 'ራሰይ ምቅታል', 'ኩሉ ምውዳእ', 'ምንባር ረብሓ የብሉን', 'ምሞት ይሓይሽ']
-            }
-        }
+        self.safety_keywords = Config.SAFETY_KEYWORDS
+
+        # General replies of support when Gemini fails or comes back empty
+        self.local_replies = LocalReplies()
 
         # Enhanced resource templates
         self.resources = {
@@ -191,34 +201,32 @@ class GeminiChat:
             }
         }
 
-    def _detect_crisis(self, message: str, language: str) -> Dict[str, bool]:
-        """Enhanced crisis detection with cultural sensitivity"""
-        message_lower = message.lower()
+    def _detect_crisis(self, message: str, language: str, hits: Optional[KeywordHits] = None) -> Dict[str, bool]:
+        """Enhanced crisis detection with cultural sensitivity
+
+        Keywords of every supported language are checked in a single scan, so a crisis is
+        caught even before the conversation language is known. Pass the hits of an earlier
+        scan of the same message to avoid scanning it again.
+        """
+        if hits is None:
+            hits = keyword_matcher.scan(message)
+
         crisis_indicators = {
-            'immediate_danger': False,
-            'suicidal_ideation': False,
+            'immediate_danger': bool(hits.get('immediate_danger')),
+            'suicidal_ideation': bool(hits.get('suicidal')),
             'high_distress': False
         }
 
-        # Check for immediate danger keywords
-        danger_words = self.safety_keywords['immediate_danger'].get(language, [])
-        if any(word in message_lower for word in danger_words):
-            crisis_indicators['immediate_danger'] = True
-
-        # Check for suicidal ideation
-        suicide_words = self.safety_keywords['suicidal'].get(language, [])
-        if any(word in message_lower for word in suicide_words):
-            crisis_indicators['suicidal_ideation'] = True
-
         # High distress indicators (multiple exclamation marks, all caps, etc.)
         if ('!!!' in message or message.isupper() and len(message) > 20 or
-                any(phrase in message_lower for phrase in ['can\'t take it', 'too much', 'exhausted'])):
+                hits.get('high_distress')):
             crisis_indicators['high_distress'] = True
 
         return crisis_indicators
 
     def _generate_crisis_response(self, crisis_type: str, language: str) -> str:
         """Generate appropriate crisis intervention response"""
+        metrics.inc('alem_responses_total', path='crisis')
         base_response = ""
 
         if crisis_type == 'immediate_danger':
@@ -231,10 +239,127 @@ class GeminiChat:
 
         return base_response + "\n\n" + self.resources[language]['emotional']
 
-    def generate_response(self, message: str, language: str, conversation_history: List[str] = []) -> str:
+    def crisis_response(self, message: str, language: str, hits: Optional[KeywordHits] = None) -> Optional[str]:
+        """Return the crisis intervention response if the message calls for one, without any LLM call"""
+        crisis_indicators = self._detect_crisis(message, language, hits)
+
+        if crisis_indicators['immediate_danger']:
+            return self._generate_crisis_response('immediate_danger', language)
+        elif crisis_indicators['suicidal_ideation']:
+            return self._generate_crisis_response('suicidal_ideation', language)
+        return None
+
+    def _system_instruction(self, language: str) -> str:
+        return self.system_prompts.get(language, self.system_prompts['en']) + self.RESPONSE_REQUIREMENTS
+
+    def _create_model(self, language: str):
+        """Build the model handle for a language, using an explicit context cache when enabled"""
+        system_instruction = self._system_instruction(language)
+        if Config.GEMINI_CONTEXT_CACHE_TTL_SECONDS:
+            ttl = timedelta(seconds=Config.GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+            try:
+                model = llm_gateway.cached_model(system_instruction, ttl, f"alem-system-{language}")
+                # Refresh a little before the upstream cache expires
+                return model, time.monotonic() + ttl.total_seconds() * 0.9
+            except Exception as e:
+                # Prompts below the model's minimum cacheable size are rejected; the plain
+                # handle still benefits from Gemini's implicit prefix caching
+                logging.warning(f"Context caching unavailable for {language}: {str(e)}")
+        return llm_gateway.model(system_instruction), None
+
+    def _model_for(self, language: str):
+        language = language if language in self.system_prompts else 'en'
+        model = self._models.get(language)
+        expires_at = self._models_expire_at.get(language)
+        if model is not None and (expires_at is None or time.monotonic() < expires_at):
+            return model
+
+        with self._models_lock:
+            if self._models.get(language) is model:
+                self._models[language], self._models_expire_at[language] = self._create_model(language)
+            return self._models[language]
+
+    def warm_up(self):
+        """Build every language's model handle ahead of the first request"""
+        for language in self.system_prompts:
+            self._model_for(language)
+        llm_gateway.model()
+
+    def _build_contents(self, message: str, language: str, conversation_history: List[str],
+                        crisis_indicators: Dict[str, bool], summary: Optional[str] = None) -> List[Dict]:
+        """Build the multi-turn contents: recent exchanges, then the current message with its analysis"""
+        # conversation_history is already trimmed to the memory budget, ends with the current
+        # message and alternates starting with the student
+        earlier = conversation_history[:-1] if conversation_history else []
+        start = len(earlier) % 2  # Contents have to open with a user turn
+
+        contents = []
+        for i in range(start, len(earlier)):
+            contents.append({'role': 'user' if i % 2 == 0 else 'model', 'parts': [earlier[i]]})
+
+        summary_context = f"\n            EARLIER IN THIS CONVERSATION:\n            {summary}\n" if summary else ""
+
+        # Enhanced prompt with specific instructions for this interaction
+        contents.append({'role': 'user', 'parts': [f"""{summary_context}
+            CURRENT SITUATION ANALYSIS:
+            - Language: {language}
+            - Crisis indicators: {crisis_indicators}
+            - Message tone: {'High distress' if crisis_indicators['high_distress'] else 'Normal conversation'}
+
+            Student's message: {message}"""]})
+        return contents
+
+    def summarize(self, summary: str, exchanges: List[str]) -> str:
+        """Fold older exchanges into the running conversation summary"""
+        lines = []
+        for i, msg in enumerate(exchanges):
+            role = "Student" if i % 2 == 0 else "Alem"
+            lines.append(f"{role}: {msg}")
+        prompt = Config.CONVERSATION_SUMMARY_PROMPT.format(
+            max_words=Config.CONVERSATION_SUMMARY_MAX_WORDS,
+            summary=summary or "(none yet)",
+            exchanges="\n".join(lines)
+        )
+        response = llm_gateway.call(
+            'summary',
+            lambda timeout: llm_gateway.model().generate_content(prompt, request_options={'timeout': timeout})
+        )
+        return response.text.strip()
+
+    @staticmethod
+    def _generation_profile(conversation_history: List[str], crisis_indicators: Dict[str, bool],
+                            student_messages: Optional[int] = None) -> str:
+        """Pick the generation settings for this stage of the conversation
+
+        student_messages counts the whole conversation, including turns already folded
+        out of the history budget; without it the verbatim history is counted.
+        """
+        if any(crisis_indicators.values()):
+            return 'high_distress'
+        if student_messages is None:
+            # The history alternates student/Alem and ends with the current student message
+            student_messages = (len(conversation_history) + 1) // 2
+        if student_messages <= Config.FIRST_CONTACT_MESSAGES:
+            return 'first_contact'
+        return 'established'
+
+    @staticmethod
+    def _priority(crisis_indicators: Dict[str, bool]) -> int:
+        """Generation for a message with any crisis indicator jumps the gateway queue"""
+        return PRIORITY_CRISIS if any(crisis_indicators.values()) else PRIORITY_GENERATION
+
+    def practical_resources(self, message: str, language: str) -> Optional[str]:
+        """Return the practical resource block if the message asks for help or resources"""
+        if any(keyword in message.lower() for keyword in ['help', 'what can i do', 'resources', 'support']):
+            return f"\n\n{self.resources[language]['practical']}"
+        return None
+
+    def generate_response(self, message: str, language: str, conversation_history: List[str] = [],
+                          hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                          student_messages: Optional[int] = None) -> str:
         try:
             # Crisis detection
-            crisis_indicators = self._detect_crisis(message, language)
+            crisis_indicators = self._detect_crisis(message, language, hits)
 
             # Handle immediate crises first
             if crisis_indicators['immediate_danger']:
@@ -242,58 +367,162 @@ class GeminiChat:
             elif crisis_indicators['suicidal_ideation']:
                 return self._generate_crisis_response('suicidal_ideation', language)
 
-            # Get the appropriate system prompt
-            system_prompt = self.system_prompts.get(language, self.system_prompts['en'])
-
-            # Enhanced conversation history with emotional context preservation
-            history_context = ""
-            if conversation_history:
-                recent_history = conversation_history[-4:]  # Last 2 exchanges
-                for i, msg in enumerate(recent_history):
-                    role = "Student" if i % 2 == 0 else "Alem"
-                    history_context += f"{role}: {msg}\n"
-
-            # Enhanced prompt with specific instructions for this interaction
-            enhanced_prompt = f"""
-            {system_prompt}
-
-            CONVERSATION CONTEXT:
-            {history_context}
-
-            CURRENT SITUATION ANALYSIS:
-            - Language: {language}
-            - Crisis indicators: {crisis_indicators}
-            - Message tone: {'High distress' if crisis_indicators['high_distress'] else 'Normal conversation'}
-
-            RESPONSE REQUIREMENTS:
-            1. Start with emotional validation
-            2. Use culturally appropriate expressions of care
-            3. Maintain hope and empowerment focus
-            4. End with gentle support statement
-            5. Keep response length appropriate (2-4 sentences for initial contact, longer for established rapport)
-
-            Student's message: {message}
-
-            Alem's response:"""
+            with metrics.stage('prompt_build'):
+                contents = self._build_contents(message, language, conversation_history, crisis_indicators, summary)
 
             # Generate response
-            response = self.model.generate_content(enhanced_prompt)
-            generated_text = response.text
-
-            # Post-processing for quality assurance
-            if not generated_text or len(generated_text.strip()) < 10:
-                return self._get_fallback_response(language, message)
-
-            # Add resources if appropriate context detected
-            if any(keyword in message.lower() for keyword in ['help', 'what can i do', 'resources', 'support']):
-                generated_text += f"\n\n{self.resources[language]['practical']}"
+            model = self._model_for(language)
+            profile = self._generation_profile(conversation_history, crisis_indicators, student_messages)
+            response = llm_gateway.call(
+                'generation',
+                lambda timeout: model.generate_content(contents, generation_config=Config.GENERATION_PROFILES[profile],
+                                                       request_options={'timeout': timeout}),
+                self._priority(crisis_indicators),
+                key=llm_gateway.request_key(Config.GEMINI_MODEL, language, profile, contents)
+            )
+            return self._finish_response(response.text, message, language)
+
+        except CallSupersededError:
+            raise
+        except Exception as e:
+            logging.error(f"Error generating response: {str(e)}")
+            metrics.inc('alem_errors_total', where='generation')
+            return self._get_fallback_response(language, message)
 
-            return generated_text
+    async def generate_response_async(self, message: str, language: str, conversation_history: List[str] = [],
+                                      hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                      student_messages: Optional[int] = None) -> str:
+        """Same as generate_response, awaiting Gemini instead of blocking the worker"""
+        try:
+            crisis_response = self.crisis_response(message, language, hits)
+            if crisis_response:
+                return crisis_response
+
+            crisis_indicators = self._detect_crisis(message, language, hits)
+            with metrics.stage('prompt_build'):
+                contents = self._build_contents(message, language, conversation_history, crisis_indicators, summary)
+
+            model = self._model_for(language)
+            profile = self._generation_profile(conversation_history, crisis_indicators, student_messages)
+            response = await llm_gateway.call_async(
+                'generation',
+                lambda timeout: model.generate_content_async(contents,
+                                                             generation_config=Config.GENERATION_PROFILES[profile],
+                                                             request_options={'timeout': timeout}),
+                self._priority(crisis_indicators),
+                key=llm_gateway.request_key(Config.GEMINI_MODEL, language, profile, contents)
+            )
+            return self._finish_response(response.text, message, language)
 
         except Exception as e:
             logging.error(f"Error generating response: {str(e)}")
+            metrics.inc('alem_errors_total', where='generation')
             return self._get_fallback_response(language, message)
 
+    def _finish_response(self, generated_text: str, message: str, language: str) -> str:
+        # Post-processing for quality assurance
+        if not generated_text or len(generated_text.strip()) < 10:
+            return self._get_fallback_response(language, message)
+
+        # Add resources if appropriate context detected
+        metrics.inc('alem_responses_total', path='llm')
+        return generated_text + (self.practical_resources(message, language) or '')
+
+    def generate_response_stream(self, message: str, language: str, conversation_history: List[str] = [],
+                                 hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                 student_messages: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """Stream the response as (event, text) pairs
+
+        Yields 'crisis' once for a crisis short-circuit, otherwise 'token' chunks as Gemini
+        produces them followed by an optional 'resources' block. 'fallback' replaces
+        whatever was streamed so far when generation fails or comes back too short.
+        """
+        crisis_indicators = self._detect_crisis(message, language, hits)
+        if crisis_indicators['immediate_danger']:
+            yield 'crisis', self._generate_crisis_response('immediate_danger', language)
+            return
+        elif crisis_indicators['suicidal_ideation']:
+            yield 'crisis', self._generate_crisis_response('suicidal_ideation', language)
+            return
+
+        generated_text = ""
+        try:
+            with metrics.stage('prompt_build'):
+                contents = self._build_contents(message, language, conversation_history, crisis_indicators, summary)
+            model = self._model_for(language)
+            generation_config = Config.GENERATION_PROFILES[
+                self._generation_profile(conversation_history, crisis_indicators, student_messages)]
+            # The streamed call returns once the first chunk is in, so its timeout and
+            # hedging apply to time-to-first-token
+            stream = llm_gateway.call(
+                'stream',
+                lambda timeout: model.generate_content(contents, stream=True, generation_config=generation_config,
+                                                       request_options={'timeout': timeout}),
+                self._priority(crisis_indicators)
+            )
+            for chunk in stream:
+                if chunk.text:
+                    generated_text += chunk.text
+                    yield 'token', chunk.text
+            metrics.record_usage('stream', stream)
+        except Exception as e:
+            logging.error(f"Error streaming response: {str(e)}")
+            metrics.inc('alem_errors_total', where='stream')
+            generated_text = ""
+
+        if len(generated_text.strip()) < 10:
+            yield 'fallback', self._get_fallback_response(language, message)
+            return
+
+        metrics.inc('alem_responses_total', path='llm')
+        resources = self.practical_resources(message, language)
+        if resources:
+            yield 'resources', resources
+
+    async def generate_response_stream_async(self, message: str, language: str,
+                                             conversation_history: List[str] = [],
+                                             hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                             student_messages: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Same events as generate_response_stream, awaiting Gemini instead of blocking the worker"""
+        crisis_response = self.crisis_response(message, language, hits)
+        if crisis_response:
+            yield 'crisis', crisis_response
+            return
+
+        generated_text = ""
+        try:
+            crisis_indicators = self._detect_crisis(message, language, hits)
+            with metrics.stage('prompt_build'):
+                contents = self._build_contents(message, language, conversation_history, crisis_indicators, summary)
+            model = self._model_for(language)
+            generation_config = Config.GENERATION_PROFILES[
+                self._generation_profile(conversation_history, crisis_indicators, student_messages)]
+            stream = await llm_gateway.call_async(
+                'stream',
+                lambda timeout: model.generate_content_async(contents, stream=True,
+                                                             generation_config=generation_config,
+                                                             request_options={'timeout': timeout}),
+                self._priority(crisis_indicators)
+            )
+            async for chunk in stream:
+                if chunk.text:
+                    generated_text += chunk.text
+                    yield 'token', chunk.text
+            metrics.record_usage('stream', stream)
+        except Exception as e:
+            logging.error(f"Error streaming response: {str(e)}")
+            metrics.inc('alem_errors_total', where='stream')
+            generated_text = ""
+
+        if len(generated_text.strip()) < 10:
+            yield 'fallback', self._get_fallback_response(language, message)
+            return
+
+        metrics.inc('alem_responses_total', path='llm')
+        resources = self.practical_resources(message, language)
+        if resources:
+            yield 'resources', resources
+
     def _get_fallback_response(self, language: str, original_message: str) -> str:
         """Enhanced fallback responses with emotional intelligence"""
         crisis_check = self._detect_crisis(original_message, language)
@@ -301,28 +530,5 @@ class GeminiChat:
         if any(crisis_check.values()):
             return self._generate_crisis_response('immediate_danger', language)
 
-        fallback_responses = {
-            'en': [
-                "I hear you, and I want you to know that you're not alone in this. Take your time - I'm here to listen.",
-                "Your courage in reaching out shows incredible strength. Whatever you're going through, you don't have to face it alone.",
-                "I believe you, and I want you to know that what you're experiencing matters. You matter."
-            ],
-            'am': [
-                "እሰማዎታለሁ፣ እና በዚህ ሁኔታ ለብቻዎ እንዳልሆኑ እንድታውቁ እፈልጋለሁ። ግዜዎን ይውሰዱ - ለማዳመጥ እዚህ ነኝ።",
-                "እርዳታ ለመጠየቅ ያለዎት ድፍረት የማይታወቅ ጥንካሬን ያሳያል። ምንም አይነት ችግር ውስጥ ቢገኙም ብቻዎን መቋቋም የለቦትም።",
-                "እዋቁዎታለሁ፣ እና እርስዎ የሚያጋጥሞት ነገር ወሳኝ እንደሆነ እንድታውቁ እፈልጋለሁ። እርስዎ ወሳኝ ናቸው።"
-            ],
-            'om': [
-                "Sin dhagayeera, haala kana keessatti kophaa akka hin taane sin beeksisuu barbaadeera. Yeroo kee fudhadhu - dhagaayuuf asuma jira.",
-                "Gargaarsa gaafachuuf jabinni kee jabina hin beekamne agarsiisa. Rakkoo kamiyyuu keessa galte illee kophaa kee fuudhachuu hin qabdu.",
-                "Sin amaneera, muuxannoon kee barbaachisaa ta'uu sin beeksisuu barbaadeera. Ati barbaachisaa dha."
-            ],
-            'ti': [
-                "ይሰምዓኻ እየ፣ ክንድዚ ኩነታት ሰለሱ ከም ዘይኮንካ ክትፈልጥ እደሊ። ግዜኻ ውሰድ - ክሰምዕ ኣብዚ እየ።",
-                "ሓገዝ ንምሕታት ዘለካ ተስፋ ዘይፍለጥ ሓይሊ ዘርኢ እዩ። ኣብ ዝኾነ ሽግር እንተ ኣቲኻ ብሓደኻ ክትቋመቶ የብልካን።",
-                "የኣምንካ እየ፣ ዘጋጠመካ ነገር ኣገዳሲ ከምዝኾነ ክትፈልጥ እደሊ። ንስኻ ኣገዳሲ ኢኻ።"
-            ]
-        }
-
-        import random
-        return random.choice(fallback_responses.get(language, fallback_responses['en']))
\ No newline at end of file
+        metrics.inc('alem_responses_total', path='fallback')
+        return self.local_replies.general(language)
\ No newline at end of file
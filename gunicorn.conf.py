@@ -0,0 +1,44 @@
+"""Gunicorn settings, picked up from the working directory: gunicorn app:app
+
+The app is imported once in the master before forking, so the prompts, keyword
+automaton, language profiles and crisis resources are built once and shared by the
+workers. The Gemini client is deliberately not part of that: grpc must not be set up
+before a fork, and leaving it out keeps the master quick to start. Each worker builds
+it in a background warm-up thread while it already answers health checks.
+
+Sessions have to be shared by the workers, so with more than one worker
+SESSION_BACKEND defaults to 'sqlite', and gunicorn refuses to start with the
+per-process 'memory' backend.
+"""
+import glob
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 60
+preload_app = True
+
+# Set before the app is preloaded, which is when Config reads it
+if workers > 1:
+    os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+
+
+def on_starting(server):
+    from config import Config
+
+    if server.cfg.workers > 1 and Config.SESSION_BACKEND == 'memory':
+        raise RuntimeError("SESSION_BACKEND=memory keeps each session in one worker process; "
+                           "use SESSION_BACKEND=sqlite or a single worker")
+
+    # Per-worker metric files of a previous run would be merged into this run's totals
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    from app import warmup
+
+    warmup.start()
@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+
+# Ethiopic combining marks are not alphanumeric but belong to the word they follow
+_ETHIOPIC_COMBINING_MARKS = {'፝', '፞', '፟'}
+
+# Single-syllable prepositions that Amharic and Tigrigna write attached to the next word
+# (የ-/ብ- "of/by", በ-/ብ- "in", ለ-/ን- "for", ከ-/ካብ- "from", ክ- "to"), e.g. ለእገዛ, ብሓገዝ
+ETHIOPIC_CLITIC_PREFIXES = {'የ', 'በ', 'ለ', 'ከ', 'ብ', 'ን', 'ክ', 'ና', 'ካ'}
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_' or char in _ETHIOPIC_COMBINING_MARKS
+
+
+def _is_ethiopic(char: str) -> bool:
+    return 'ሀ' <= char <= '᎟' or 'ⶀ' <= char <= '⷟' or '꬀' <= char <= '꬯'
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, treating the Ethiopic wordspace (፡) as a space"""
+    return ' '.join(text.replace('፡', ' ').lower().split())
+
+
+class KeywordHits(dict):
+    """Mapping of keyword category to the set of languages whose keywords matched"""
+
+    def language_for(self, category: str, preferred: Optional[str] = None) -> Optional[str]:
+        """Pick the language to answer a hit in, favouring the conversation's own language"""
+        languages = self.get(category)
+        if not languages:
+            return None
+        if preferred in languages:
+            return preferred
+        return next(lang for lang in Config.SUPPORTED_LANGUAGES if lang in languages)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every keyword list in every supported language
+
+    A message is scanned once, whatever the number of keywords, and every category that
+    matched is reported. Keywords marked whole_word must sit on word boundaries; an
+    Ethiopic keyword may additionally carry one attached clitic prefix.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Keywords ending at each state, and the same lists extended along the failure links
+        self._keywords: List[List[Tuple[int, str, str, bool]]] = [[]]
+        self._output: List[List[Tuple[int, str, str, bool]]] = [[]]
+        self._built = False
+
+    @classmethod
+    def from_config(cls) -> 'KeywordMatcher':
+        matcher = cls()
+        matcher.add_keywords('escalation', Config.ESCALATION_KEYWORDS, whole_word=True)
+        for category, keywords in Config.SAFETY_KEYWORDS.items():
+            matcher.add_keywords(category, keywords, whole_word=False)
+        matcher.add_keywords('high_distress', Config.DISTRESS_PHRASES, whole_word=False)
+        matcher.build()
+        return matcher
+
+    def add_keywords(self, category: str, keywords: Dict[str, List[str]], whole_word: bool):
+        for language, words in keywords.items():
+            for word in words:
+                self.add(word, category, language, whole_word)
+
+    def add(self, keyword: str, category: str, language: str, whole_word: bool = True):
+        keyword = normalize_text(keyword)
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._keywords.append([])
+            state = next_state
+        self._keywords[state].append((len(keyword), category, language, whole_word))
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first and merge the outputs they lead to"""
+        self._output = [list(keywords) for keywords in self._keywords]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        if end < len(text) and _is_word_char(text[end]):
+            return False
+        if start == 0 or not _is_word_char(text[start - 1]):
+            return True
+        # Allow a single attached Ethiopic preposition in front of an Ethiopic keyword
+        return (_is_ethiopic(text[start]) and text[start - 1] in ETHIOPIC_CLITIC_PREFIXES and
+                (start == 1 or not _is_word_char(text[start - 2])))
+
+    def scan(self, message: str) -> KeywordHits:
+        """Return every keyword category found in the message, with the languages that matched"""
+        if not self._built:
+            self.build()
+
+        text = normalize_text(message)
+        hits = KeywordHits()
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, category, language, whole_word in self._output[state]:
+                if whole_word and not self._on_boundary(text, index + 1 - length, index + 1):
+                    continue
+                hits.setdefault(category, set()).add(language)
+        return hits
+
+
+# Built once at startup from the configured keyword lists
+keyword_matcher = KeywordMatcher.from_config()
@@ -1,49 +1,285 @@
-import google.generativeai as genai
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
 from config import Config
+from language_profiles import PROFILE_SEED_TEXT
+from llm_gateway import llm_gateway
+from metrics import metrics
+from resilience import CallSupersededError
+
+
+# Languages that share a script; the n-gram profiles only have to separate these pairs
+SCRIPT_LANGUAGES = {
+    'ethiopic': ('am', 'ti'),
+    'latin': ('en', 'om'),
+}
+
+# Number of n-grams after which a message counts as long enough to judge on its own.
+# Ethiopic characters are syllables, so they carry roughly twice the signal of a Latin letter.
+SCRIPT_EVIDENCE_NGRAMS = {
+    'ethiopic': 12,
+    'latin': 24,
+}
+
+# Share of a message's trigrams the best profile is expected to have seen when the message
+# really is in that language. Amharic or Tigrigna written in Latin letters fits neither
+# English nor Oromifa and falls well short of it, however clearly one of them wins.
+SCRIPT_TRIGRAM_COVERAGE = {
+    'ethiopic': 0.3,
+    'latin': 0.6,
+}
+
+# Words after which a message counts as long enough to judge on its own; a single word
+# (ሰላም, "hi") is often shared between the languages of its script
+EVIDENCE_WORDS = 2
+
+_NON_LETTER = re.compile(r"[^\w']+")
+
+
+def _is_ethiopic(char: str) -> bool:
+    code = ord(char)
+    return (0x1200 <= code <= 0x139F or   # Ethiopic, Ethiopic Supplement
+            0x2D80 <= code <= 0x2DDF or   # Ethiopic Extended
+            0xAB00 <= code <= 0xAB2F)     # Ethiopic Extended-A
+
+
+def _is_latin(char: str) -> bool:
+    return (char.isascii() and char.isalpha()) or 'À' <= char <= 'ɏ'  # Basic Latin to Latin Extended-B
+
+
+class LocalLanguageDetector:
+    """Offline detector: Unicode script first, then character n-grams within the script"""
+
+    def __init__(self, seed_text: Dict[str, str] = PROFILE_SEED_TEXT, max_n: int = 3):
+        self.max_n = max_n
+        self.profiles = {lang: self._build_profile(text) for lang, text in seed_text.items()}
+
+    def _ngrams(self, text: str):
+        for word in _NON_LETTER.sub(' ', text.lower()).split():
+            padded = f" {word} "
+            for n in range(1, self.max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    gram = padded[i:i + n]
+                    if gram != ' ':
+                        yield gram
+
+    def _build_profile(self, text: str) -> Tuple[Dict[str, float], float]:
+        """Return add-one smoothed log probabilities and the log probability of an unseen n-gram"""
+        counts = Counter(self._ngrams(text))
+        total = sum(counts.values()) + len(counts) + 1
+        log_probs = {gram: math.log((count + 1) / total) for gram, count in counts.items()}
+        return log_probs, math.log(1 / total)
+
+    @staticmethod
+    def classify_script(text: str) -> Tuple[Optional[str], float]:
+        """Return the dominant script and the share of letters written in it"""
+        ethiopic = latin = 0
+        for char in text:
+            if _is_ethiopic(char):
+                ethiopic += 1
+            elif _is_latin(char):
+                latin += 1
+
+        letters = ethiopic + latin
+        if not letters:
+            return None, 0.0
+        if ethiopic >= latin:
+            return 'ethiopic', ethiopic / letters
+        return 'latin', latin / letters
+
+    def detect(self, text: str) -> Tuple[Optional[str], float]:
+        """Detect the language of the text, returning the language code and a 0-1 confidence"""
+        script, purity = self.classify_script(text)
+        if script is None:
+            return None, 0.0
+
+        words = _NON_LETTER.sub(' ', text).split()
+        grams = list(self._ngrams(text))
+        scores = {}
+        for lang in SCRIPT_LANGUAGES[script]:
+            log_probs, unseen = self.profiles[lang]
+            scores[lang] = sum(log_probs.get(gram, unseen) for gram in grams)
+
+        (best, best_score), (_, runner_up) = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        # Posterior of the best language against the other one sharing its script. Overlapping
+        # n-grams of different orders are far from independent, so the margin is tempered by max_n.
+        margin = min((best_score - runner_up) / self.max_n, 50.0)
+        posterior = 1 / (1 + math.exp(-margin))
+        evidence = min(1.0, len(grams) / SCRIPT_EVIDENCE_NGRAMS[script], len(words) / EVIDENCE_WORDS)
+        # How well the best profile fits at all, since the posterior only compares the two
+        # languages of the script: unfamiliar text gets a low confidence and goes to Gemini
+        log_probs, _ = self.profiles[best]
+        trigrams = [gram for gram in grams if len(gram) == 3]
+        coverage = sum(gram in log_probs for gram in trigrams) / len(trigrams) if trigrams else 0.0
+        fit = min(1.0, coverage / SCRIPT_TRIGRAM_COVERAGE[script])
+        return best, purity * posterior * evidence * fit
 
 
 class LanguageDetector:
     def __init__(self):
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.local_detector = LocalLanguageDetector()
+        self.confidence_threshold = Config.LOCAL_DETECTION_CONFIDENCE_THRESHOLD
+
+        # Memo of past detections keyed by a hash of the normalized text, so that the
+        # frequent short replies ("ok", "yes", "እሺ") are detected once per process
+        self._memo = LRUCache(maxsize=Config.LANGUAGE_DETECTION_CACHE_SIZE)
+        self._memo_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Built on first use so the Gemini client stays out of startup
+        return llm_gateway.model()
+
+    def warm_up(self):
+        """Build the detection model handle ahead of the first request"""
+        llm_gateway.model()
+
+    @staticmethod
+    def _memo_key(text: str) -> str:
+        normalized = ' '.join(text.lower().split())
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+    def detect_language_locally(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Resolve the language from the memo or the local detector, without any upstream call
+
+        Returns the resolved language (None if Gemini has to decide) and the best local guess.
+        """
+        if not text.strip():
+            return Config.DEFAULT_LANGUAGE, Config.DEFAULT_LANGUAGE
+
+        with self._memo_lock:
+            cached = self._memo.get(self._memo_key(text))
+        if cached is not None:
+            return cached, cached
+
+        # Most messages resolve from script and n-grams alone; only ambiguous ones go to Gemini
+        local_lang, confidence = self.local_detector.detect(text)
+        if local_lang and confidence >= self.confidence_threshold:
+            self._remember(text, local_lang)
+            return local_lang, local_lang
+        return None, local_lang
+
+    def _remember(self, text: str, language: str):
+        with self._memo_lock:
+            self._memo[self._memo_key(text)] = language
+
+    def _validate(self, text: str, response_text: str, local_lang: Optional[str]) -> str:
+        detected_lang = response_text.strip().lower()
+
+        # Validate the detected language
+        if detected_lang not in Config.SUPPORTED_LANGUAGES:
+            detected_lang = local_lang or Config.DEFAULT_LANGUAGE
+
+        self._remember(text, detected_lang)
+        return detected_lang
 
     def detect_language(self, text):
         """Detect the language of the given text"""
-        if not text.strip():
-            return Config.DEFAULT_LANGUAGE
+        resolved, local_lang = self.detect_language_locally(text)
+        if resolved:
+            return resolved
+
+        try:
+            prompt = Config.LANGUAGE_DETECTION_PROMPT.format(text=text)
+            response = llm_gateway.call(
+                'detection',
+                lambda timeout: self.model.generate_content(prompt, request_options={'timeout': timeout}),
+                key=llm_gateway.request_key(Config.GEMINI_MODEL, prompt)
+            )
+            return self._validate(text, response.text, local_lang)
+        except CallSupersededError:
+            raise
+        except Exception as e:
+            # Upstream failures are not memoized so the next occurrence can try again
+            print(f"Language detection error: {e}")
+            metrics.inc('alem_errors_total', where='detection')
+            return local_lang or Config.DEFAULT_LANGUAGE
+
+    async def detect_language_async(self, text):
+        """Detect the language of the given text without blocking the event loop"""
+        resolved, local_lang = self.detect_language_locally(text)
+        if resolved:
+            return resolved
 
         try:
             prompt = Config.LANGUAGE_DETECTION_PROMPT.format(text=text)
-            response = self.model.generate_content(prompt)
-            detected_lang = response.text.strip().lower()
+            response = await llm_gateway.call_async(
+                'detection',
+                lambda timeout: self.model.generate_content_async(prompt, request_options={'timeout': timeout}),
+                key=llm_gateway.request_key(Config.GEMINI_MODEL, prompt)
+            )
+            return self._validate(text, response.text, local_lang)
+        except Exception as e:
+            print(f"Language detection error: {e}")
+            metrics.inc('alem_errors_total', where='detection')
+            return local_lang or Config.DEFAULT_LANGUAGE
 
-            # Validate the detected language
-            if detected_lang in Config.SUPPORTED_LANGUAGES:
-                return detected_lang
+    def detect_languages(self, texts: List[str]) -> List[str]:
+        """Detect many texts at once, with one Gemini call per batch of texts local detection leaves open"""
+        results = [None] * len(texts)
+        unresolved = {}  # Distinct text -> (local guess, indexes)
+        for index, text in enumerate(texts):
+            resolved, local_lang = self.detect_language_locally(text)
+            if resolved:
+                results[index] = resolved
             else:
-                return Config.DEFAULT_LANGUAGE
+                unresolved.setdefault(text, (local_lang, []))[1].append(index)
 
+        pending = list(unresolved)
+        for start in range(0, len(pending), Config.LANGUAGE_DETECTION_BATCH_SIZE):
+            chunk = pending[start:start + Config.LANGUAGE_DETECTION_BATCH_SIZE]
+            if len(chunk) == 1:
+                languages = [self.detect_language(chunk[0])]
+            else:
+                languages = self._detect_batch(chunk, [unresolved[text][0] for text in chunk])
+            for text, language in zip(chunk, languages):
+                for index in unresolved[text][1]:
+                    results[index] = language
+        return results
+
+    def _detect_batch(self, texts: List[str], local_langs: List[Optional[str]]) -> List[str]:
+        try:
+            numbered = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+            prompt = Config.LANGUAGE_DETECTION_BATCH_PROMPT.format(texts=numbered)
+            response = llm_gateway.call(
+                'detection',
+                lambda timeout: self.model.generate_content(prompt, request_options={'timeout': timeout}),
+                key=llm_gateway.request_key(Config.GEMINI_MODEL, prompt)
+            )
+            match = re.search(r'\[.*\]', response.text, re.DOTALL)
+            codes = json.loads(match.group(0)) if match else None
+            if not isinstance(codes, list) or len(codes) != len(texts):
+                raise ValueError(f"Expected {len(texts)} language codes")
+            return [self._validate(text, str(code), local_lang)
+                    for text, code, local_lang in zip(texts, codes, local_langs)]
         except Exception as e:
-            print(f"Language detection error: {e}")
-            return Config.DEFAULT_LANGUAGE
+            logging.error(f"Batch language detection error: {str(e)}")
+            metrics.inc('alem_errors_total', where='detection')
+            return [local_lang or Config.DEFAULT_LANGUAGE for local_lang in local_langs]
 
-    def is_language_settled(self, conversation_history):
-        """Check if the language has been consistently used in recent messages"""
-        if len(conversation_history) < 3:
-            return False
+    def record_detection(self, detected_languages: List[str], language: str) -> List[str]:
+        """Append a per-message detection to the session's rolling window"""
+        window = (detected_languages or []) + [language]
+        return window[-Config.LANGUAGE_SETTLE_WINDOW:]
 
-        # Get the last few user messages
-        user_messages = [msg for i, msg in enumerate(conversation_history) if i % 2 == 0]
-        recent_messages = user_messages[-3:]
+    def is_language_settled(self, detected_languages: List[str]):
+        """Check if the language has been consistently used in recent messages
 
-        # Detect language for each recent message
-        detected_languages = []
-        for msg in recent_messages:
-            lang = self.detect_language(msg)
-            detected_languages.append(lang)
+        Works on the rolling window kept in the session, so no message is ever detected twice.
+        """
+        if len(detected_languages) < Config.LANGUAGE_SETTLE_MIN_MESSAGES:
+            return False
 
         # If all recent messages are in the same language, consider it settled
-        if len(set(detected_languages)) == 1:
-            return detected_languages[0]
+        recent = detected_languages[-Config.LANGUAGE_SETTLE_WINDOW:]
+        if len(set(recent)) == 1:
+            return recent[0]
 
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,81 @@
+"""Seed text used to build the character n-gram profiles of the local language detector.
+
+The samples only need to capture the letter and syllable distribution of each
+language, not to be grammatical prose. Amharic and Tigrigna share the Ethiopic
+script, English and Oromifa share the Latin script, so each sample leans on the
+function words and spellings that tell the pair apart (e.g. Tigrigna ኣ/ሓ/ዓ/ኽ
+and "እዩ", Amharic አ/ሽ/ኝ and "ነው", Oromifa doubled vowels and dh/ch/ny/x/q).
+"""
+
+PROFILE_SEED_TEXT = {
+    'en': """
+    hello hi hey yes no okay thank you thanks please sorry i am here i am not okay
+    i need help i need to talk to someone i feel scared and alone i don't know what to do
+    he hurt me last night and i can't stop crying my friend told me to reach out
+    i am a student at the university and i live in the dormitory with other girls
+    what happened to me was not my fault i want to feel safe again
+    can you help me find support i am afraid to tell my family
+    i feel tired and sad all the time i cannot sleep or eat
+    my teacher keeps touching me and threatening my grades
+    is this conversation private who can see what i write
+    thank you for listening it means a lot to me
+    i think i should go to the police but i am worried about what people will say
+    where can i go tonight i don't want to go back home
+    how are you doing today i am fine just a bit stressed about exams
+    the counselor said i should talk about my feelings with someone i trust
+    """,
+
+    'om': """
+    akkam akkam jirta nagaa dha galatoomi eeyyee lakki maaloo dhiifama
+    ani gargaarsa barbaada nama tokko wajjin haasa'uu barbaada
+    sodaachaa jira kophaa koo jira maal gochuu akka qabu hin beeku
+    inni edana na miidhe boo'uu dhiisuu hin dandeenye hiriyyaan koo akka ani gaafadhu natti hime
+    ani barataa yuunivarsiitii ti mana jireenyaa keessa shamarran biroo wajjin jiraadha
+    wanti natti dhufe balleessaa koo miti ammas nageenya argachuu barbaada
+    deeggarsa argachuuf na gargaaruu dandeessaa maatii kootti himuu sodaadha
+    yeroo hunda dadhabaa fi gaddaa dha rafuu ykn nyaachuu hin danda'u
+    barsiisaan koo na tuqaa jira qabxii koo irratti na doorsisa
+    haasaan kun dhoksaa dhaa eenyutu waan ani barreessu arga
+    na dhaggeeffachuu keef galatoomi baay'ee naaf barbaachisa
+    poolisii dhaquu qaba jedheen yaada garuu waan namoonni jedhan sodaadha
+    halkan kana eessa deemuu danda'a mana deebi'uu hin barbaadu
+    har'a akkam jirta ani nagaa dha qormaata irraa xiqqoo dhiphadheera
+    gorsaan koo miira koo nama amanamu wajjin haasa'uu akka qabu natti hime
+    """,
+
+    'am': """
+    ሰላም ጤና ይስጥልኝ አዎ አይ እሺ አመሰግናለሁ እባክሽ ይቅርታ እዚህ ነኝ ደህና አይደለሁም
+    እርዳታ እፈልጋለሁ ከአንድ ሰው ጋር መነጋገር እፈልጋለሁ ፈርቻለሁ ብቻዬን ነኝ ምን እንደማደርግ አላውቅም
+    ትናንት ማታ ጎዳኝ ማልቀስ ማቆም አልቻልኩም ጓደኛዬ እንድጠይቅ ነገረችኝ
+    እኔ የዩኒቨርሲቲ ተማሪ ነኝ ከሌሎች ሴቶች ጋር በማደሪያ ውስጥ እኖራለሁ
+    የደረሰብኝ ነገር የእኔ ጥፋት አይደለም እንደገና ደህንነት እንዲሰማኝ እፈልጋለሁ
+    ድጋፍ እንዳገኝ ልትረዱኝ ትችላላችሁ ለቤተሰቤ መንገር እፈራለሁ
+    ሁልጊዜ ድካም እና ሀዘን ይሰማኛል መተኛትም ሆነ መብላት አልችልም
+    አስተማሪዬ ይነካኛል ውጤትሽን እቀንሳለሁ ብሎ ያስፈራራኛል
+    ይህ ንግግር ሚስጥራዊ ነው የምጽፈውን ማን ያያል
+    ስላዳመጥሽኝ አመሰግናለሁ ለእኔ ትልቅ ትርጉም አለው
+    ወደ ፖሊስ መሄድ ያለብኝ ይመስለኛል ግን ሰዎች ምን ይላሉ ብዬ እጨነቃለሁ
+    ዛሬ ማታ የት መሄድ እችላለሁ ወደ ቤት መመለስ አልፈልግም
+    ዛሬ እንዴት ነሽ ደህና ነኝ ስለ ፈተና ትንሽ ተጨንቄያለሁ
+    አማካሪዋ ስሜቴን ከማምነው ሰው ጋር እንዳወራ ነገረችኝ
+    ምንም አይደለም ብዙ ነው አሁን የለም ናቸው አሉ እሱ እሷ እነሱ
+    """,
+
+    'ti': """
+    ሰላም ከመይ ኣለኺ እወ ኣይፋልን ሕራይ የቐንየለይ በጃኺ ይቕሬታ ኣብዚ ኣለኹ ጽቡቕ ኣይኮንኩን
+    ሓገዝ እደሊ ምስ ሓደ ሰብ ክዛረብ እደሊ ፈሪሐ ኣለኹ በይነይ እየ እንታይ ከም ዝገብር ኣይፈልጥን
+    ትማሊ ምሸት ጎድኣኒ ምብካይ ከቋርጽ ኣይከኣልኩን ዓርከይ ክሓትት ነጊራትኒ
+    ኣነ ተምሃሪት ዩኒቨርሲቲ እየ ምስ ካልኦት ኣዋልድ ኣብ መደቀሲ እነብር
+    ዘጋጠመኒ ነገር ናተይ ጌጋ ኣይኮነን ደጊም ውሕስነት ክስምዓኒ እደሊ
+    ደገፍ ክረክብ ክትሕግዙኒ ትኽእሉ ዶ ንስድራይ ክነግር እፈርሕ እየ
+    ኩሉ ግዜ ድኻምን ጓሂን ይስምዓኒ ክድቅስ ወይ ክበልዕ ኣይክእልን
+    መምህረይ ይትንክፈኒ ኣሎ ነጥብኺ ክንክዮ እየ ኢሉ የፈራርሓኒ
+    እዚ ዝርርብ ምስጢራዊ ድዩ ዝጽሕፎ መን ይርእዮ
+    ስለ ዝሰማዕክኒ የቐንየለይ ንዓይ ብዙሕ ትርጉም ኣለዎ
+    ናብ ፖሊስ ክኸይድ ኣለኒ ይመስለኒ ግን ሰባት እንታይ ክብሉ እዮም ኢለ እሻቐል
+    ሎሚ ምሸት ናበይ ክኸይድ እኽእል ናብ ገዛ ክምለስ ኣይደልን
+    ሎሚ ከመይ ኣለኺ ጽቡቕ እየ ብዛዕባ ፈተና ቁሩብ ተሻቒለ
+    እታ ኣማኻሪት ስምዒተይ ምስ ዝኣምኖ ሰብ ክዛረብ ነጊራትኒ
+    ሕጂ የለን እዩ ኢዩ ኣሎ ኣለዉ ንሱ ንሳ ንሳቶም ኢኻ ኢኺ ንስኻ ንስኺ ናይ ምስ ናብ
+    """,
+}
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from config import Config
+from metrics import metrics
+from resilience import GatewayOverloadedError, ResilientCaller
+from single_flight import SingleFlight
+
+T = TypeVar('T')
+
+# Lower runs first: crisis and high-distress generation jumps ahead of routine work
+PRIORITY_CRISIS = 0
+PRIORITY_GENERATION = 1
+PRIORITY_DETECTION = 2
+PRIORITY_BACKGROUND = 3
+
+STAGE_PRIORITIES = {
+    'generation': PRIORITY_GENERATION,
+    'stream': PRIORITY_GENERATION,
+    'detection': PRIORITY_DETECTION,
+    'summary': PRIORITY_BACKGROUND,
+}
+
+
+class TokenBucket:
+    """Rate limiter allowing `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class LLMGateway:
+    """Single entry point for every Gemini call made by the process
+
+    Owns the client configuration and model handles, caps the number of concurrent
+    upstream calls, rate limits them with a token bucket and runs queued calls in
+    priority order. When the queue is full new calls are rejected straight away.
+    """
+
+    def __init__(self, max_concurrency: int = Config.LLM_MAX_CONCURRENCY,
+                 max_queue: int = Config.LLM_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rate_limiter = TokenBucket(Config.LLM_RATE_LIMIT_PER_SECOND, Config.LLM_RATE_LIMIT_BURST)
+        self.caller = ResilientCaller(self)
+        self.single_flight = SingleFlight(Config.LLM_SINGLE_FLIGHT_WINDOWS)
+        # Wraps each call run on a worker, e.g. profiling.follow_request; only set by app.py
+        # when request profiling is configured, so calls are otherwise queued as they are
+        self.call_wrapper: Optional[Callable[[Callable[[], T]], Callable[[], T]]] = None
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._workers_pid = None
+        self._configured = False
+        self._models = {}
+        self._lock = threading.Lock()
+
+    # Client and models
+
+    def _configure(self):
+        # The client pulls in grpc and protobuf, so it is only imported once a model is needed
+        import google.generativeai as genai
+
+        if not self._configured:
+            genai.configure(api_key=Config.GEMINI_API_KEY)
+            self._configured = True
+        return genai
+
+    def model(self, system_instruction: Optional[str] = None):
+        """Shared model handle, one per distinct system instruction"""
+        with self._lock:
+            model = self._models.get(system_instruction)
+            if model is None:
+                genai = self._configure()
+                model = genai.GenerativeModel(Config.GEMINI_MODEL, system_instruction=system_instruction)
+                self._models[system_instruction] = model
+            return model
+
+    def cached_model(self, system_instruction: str, ttl, display_name: str):
+        """Model handle backed by an explicit context cache holding the system instruction"""
+        with self._lock:
+            genai = self._configure()
+        from google.generativeai import caching
+
+        cached = caching.CachedContent.create(
+            model=Config.GEMINI_MODEL,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=ttl
+        )
+        return genai.GenerativeModel.from_cached_content(cached)
+
+    # Calls
+
+    @staticmethod
+    def request_key(*payload) -> str:
+        """Identity of a request payload, e.g. (model, language, contents), for single-flight sharing"""
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+    def call(self, stage: str, fn: Callable[[float], T], priority: Optional[int] = None,
+             key: Optional[str] = None) -> T:
+        """Run fn(timeout) through the queue under the stage's timeouts, hedging and circuit breaker
+
+        Calls given the same key while one is in flight share its upstream call and result.
+        """
+        priority = STAGE_PRIORITIES.get(stage, PRIORITY_GENERATION) if priority is None else priority
+        if key is None:
+            return self.caller.call(stage, fn, priority)
+        result, shared = self.single_flight.do(stage, key, lambda: self.caller.call(stage, fn, priority))
+        if shared:
+            metrics.inc('alem_llm_coalesced_total', stage=stage)
+        return result
+
+    async def call_async(self, stage: str, fn: Callable[[float], Awaitable[T]],
+                         priority: Optional[int] = None, key: Optional[str] = None) -> T:
+        priority = STAGE_PRIORITIES.get(stage, PRIORITY_GENERATION) if priority is None else priority
+        if key is None:
+            return await self.caller.call_async(stage, fn, priority)
+        result, shared = await self.single_flight.do_async(
+            stage, key, lambda: self.caller.call_async(stage, fn, priority))
+        if shared:
+            metrics.inc('alem_llm_coalesced_total', stage=stage)
+        return result
+
+    # Queue
+
+    def _ensure_workers(self):
+        # Workers are started lazily and again after a fork, since threads do not survive one
+        if self._workers_pid == os.getpid():
+            return
+        with self._lock:
+            if self._workers_pid == os.getpid():
+                return
+            self._queue = []
+            self._condition = threading.Condition()
+            for index in range(self.max_concurrency):
+                threading.Thread(target=self._work, name=f'llm-gateway-{index}', daemon=True).start()
+            self._workers_pid = os.getpid()
+
+    def _enqueue(self, priority: int, run: Callable[[], T]) -> Future:
+        self._ensure_workers()
+        future = Future()
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                # Make room by shedding the least urgent, most recent queued call, if it is
+                # less urgent than this one; otherwise shed this one
+                worst = max(self._queue, key=lambda item: (item[0], item[1]))
+                if worst[0] <= priority:
+                    raise GatewayOverloadedError("LLM gateway queue is full")
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                if worst[2].set_running_or_notify_cancel():
+                    worst[2].set_exception(GatewayOverloadedError("Shed for a more urgent call"))
+            heapq.heappush(self._queue, (priority, next(self._sequence), future, run))
+            self._condition.notify()
+        return future
+
+    def submit(self, fn: Callable[[float], T], timeout: float, priority: int) -> Future:
+        """Queue a blocking call; it runs on a gateway worker"""
+        def run():
+            return fn(timeout)
+
+        if self.call_wrapper is not None:
+            run = self.call_wrapper(run)
+        return self._enqueue(priority, run)
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Hold a concurrency slot while the block awaits its upstream call on the caller's loop"""
+        loop = asyncio.get_running_loop()
+        acquired = loop.create_future()
+        release = threading.Event()
+
+        def run():
+            loop.call_soon_threadsafe(lambda: acquired.done() or acquired.set_result(None))
+            release.wait()
+
+        def shed(done: Future):
+            # Shed while queued for a more urgent call: fail the waiting block straight away
+            if not done.cancelled() and done.exception() is not None:
+                error = done.exception()
+                loop.call_soon_threadsafe(lambda: acquired.done() or acquired.set_exception(error))
+
+        future = self._enqueue(priority, run)
+        future.add_done_callback(shed)
+        try:
+            await acquired
+            yield
+        finally:
+            if not future.cancel():
+                release.set()
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _work(self):
+        condition = self._condition
+        while True:
+            with condition:
+                while not self._queue:
+                    condition.wait()
+                _, _, future, run = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue  # Cancelled while queued, e.g. a superseded hedge
+            try:
+                self.rate_limiter.acquire()
+                future.set_result(run())
+            except BaseException as e:
+                future.set_exception(e)
+
+
+# Shared by GeminiChat and LanguageDetector
+llm_gateway = LLMGateway()
@@ -0,0 +1,139 @@
+import random
+from typing import Optional
+
+from keyword_matcher import normalize_text
+
+# Word stems hinting at what a message is about, matched as substrings of the normalized
+# message; topics are tried in this order. Ethiopic stems stop before the last syllable
+# of the word, whose vowel changes with suffixes (ቤተሰብ, ቤተሰቤ).
+REPLY_CUES = {
+    'thanks': {
+        'en': ['thank'],
+        'am': ['አመሰግ'],
+        'om': ['galatoom'],
+        'ti': ['የቐንየለይ', 'የቐንየልና'],
+    },
+    'sleep': {
+        'en': ['sleep', 'slept', 'tired', 'exhausted', 'nightmare'],
+        'am': ['መተኛት', 'እንቅልፍ', 'ድካም', 'ደክሞኛል'],
+        'om': ['rafuu', 'hirriba', 'dadhab'],
+        'ti': ['ድቃስ', 'ደኺመ', 'ድኻም'],
+    },
+    'family': {
+        'en': ['family', 'parents', 'mother', 'father', 'mom', 'dad'],
+        'am': ['ቤተሰ', 'እናቴ', 'አባቴ'],
+        'om': ['maatii', 'haadha', 'abbaa'],
+        'ti': ['ስድራ', 'ኣደይ', 'ኣቦይ'],
+    },
+    'school': {
+        'en': ['school', 'class', 'exam', 'teacher', 'dorm', 'campus', 'grades'],
+        'am': ['ትምህር', 'ፈተና', 'አስተማሪ', 'ማደሪያ'],
+        'om': ['barumsa', 'qormaata', 'barsiisaa', 'kilaasii'],
+        'ti': ['ትምህር', 'ፈተና', 'መምህር'],
+    },
+    'fear': {
+        'en': ['scared', 'afraid', 'fear', 'terrified'],
+        'am': ['እፈራ', 'ፈርቻ', 'ፍርሃት'],
+        'om': ['sodaa'],
+        'ti': ['ፈሪሐ', 'ፍርሒ', 'እፈርህ'],
+    },
+    'alone': {
+        'en': ['alone', 'lonely', 'nobody', 'no one'],
+        'am': ['ብቻዬን', 'ማንም'],
+        'om': ['kophaa', 'namni hin jiru'],
+        'ti': ['በይነይ', 'ሓደ ሰብ የለን'],
+    },
+}
+
+# Short supportive replies per topic and language; 'general' answers anything else and is
+# what GeminiChat falls back to. Amharic addresses the student with the polite እርስዎ and
+# Tigrigna with ንስኻ, as the general replies always have.
+LOCAL_REPLIES = {
+    'general': {
+        'en': [
+            "I hear you, and I want you to know that you're not alone in this. Take your time - I'm here to listen.",
+            "Your courage in reaching out shows incredible strength. Whatever you're going through, you don't have to face it alone.",
+            "I believe you, and I want you to know that what you're experiencing matters. You matter."
+        ],
+        'am': [
+            "እሰማዎታለሁ፣ እና በዚህ ሁኔታ ለብቻዎ እንዳልሆኑ እንድታውቁ እፈልጋለሁ። ግዜዎን ይውሰዱ - ለማዳመጥ እዚህ ነኝ።",
+            "እርዳታ ለመጠየቅ ያለዎት ድፍረት የማይታወቅ ጥንካሬን ያሳያል። ምንም አይነት ችግር ውስጥ ቢገኙም ብቻዎን መቋቋም የለቦትም።",
+            "እዋቁዎታለሁ፣ እና እርስዎ የሚያጋጥሞት ነገር ወሳኝ እንደሆነ እንድታውቁ እፈልጋለሁ። እርስዎ ወሳኝ ናቸው።"
+        ],
+        'om': [
+            "Sin dhagayeera, haala kana keessatti kophaa akka hin taane sin beeksisuu barbaadeera. Yeroo kee fudhadhu - dhagaayuuf asuma jira.",
+            "Gargaarsa gaafachuuf jabinni kee jabina hin beekamne agarsiisa. Rakkoo kamiyyuu keessa galte illee kophaa kee fuudhachuu hin qabdu.",
+            "Sin amaneera, muuxannoon kee barbaachisaa ta'uu sin beeksisuu barbaadeera. Ati barbaachisaa dha."
+        ],
+        'ti': [
+            "ይሰምዓኻ እየ፣ ክንድዚ ኩነታት ሰለሱ ከም ዘይኮንካ ክትፈልጥ እደሊ። ግዜኻ ውሰድ - ክሰምዕ ኣብዚ እየ።",
+            "ሓገዝ ንምሕታት ዘለካ ተስፋ ዘይፍለጥ ሓይሊ ዘርኢ እዩ። ኣብ ዝኾነ ሽግር እንተ ኣቲኻ ብሓደኻ ክትቋመቶ የብልካን።",
+            "የኣምንካ እየ፣ ዘጋጠመካ ነገር ኣገዳሲ ከምዝኾነ ክትፈልጥ እደሊ። ንስኻ ኣገዳሲ ኢኻ።"
+        ]
+    },
+    'thanks': {
+        'en': ["Thank you for trusting me with this. I'm here whenever you want to talk again."],
+        'am': ["ስላመኑኝ አመሰግናለሁ። እንደገና ማውራት ሲፈልጉ እዚህ ነኝ።"],
+        'om': ["Na amanuu keef galatoomi. Yeroo biraa dubbachuu yoo barbaadde asuman jira."],
+        'ti': ["ስለ ዝኣመንካኒ የቐንየለይ። ደጊም ክትዛረብ ምስ ደለኻ ኣብዚ ኣለኹ።"]
+    },
+    'sleep': {
+        'en': ["Not being able to sleep is exhausting, and it makes sense after what you're carrying. Would you like to tell me what keeps you awake?"],
+        'am': ["መተኛት አለመቻል በጣም ያደክማል። ምን እንደሚያስጨንቅዎ ሊነግሩኝ ይፈልጋሉ?"],
+        'om': ["Rafuu dadhabuun baay'ee nama dadhabsiisa. Maaltu hirriba si dhowwe natti himuu barbaaddaa?"],
+        'ti': ["ድቃስ ምስኣን ኣዝዩ የድክም እዩ። እንታይ ከም ዘጨንቐካ ክትነግረኒ ትደሊ ዶ?"]
+    },
+    'family': {
+        'en': ["Worrying about how your family will react is very heavy. You get to decide what to share and when. Would it help to talk it through?"],
+        'am': ["ቤተሰብዎ ምን ይላሉ ብሎ መጨነቅ ከባድ ነው። ምን እና መቼ እንደሚናገሩ የሚወስኑት እርስዎ ነዎት።"],
+        'om': ["Maatiin kee maal jedhu jettee yaaddoo'uun ulfaataa dha. Maal fi yoom akka dubbattu kan murteessitu sidha."],
+        'ti': ["ስድራኻ እንታይ ክብሉ እዮም ኢልካ ምጭናቕ ከቢድ እዩ። እንታይን መዓስን ከም እትዛረብ እትውስን ንስኻ ኢኻ።"]
+    },
+    'school': {
+        'en': ["It's understandable that school feels hard right now. Your wellbeing comes first. What feels most difficult at the moment?"],
+        'am': ["አሁን ትምህርት ከባድ መሆኑ የሚገባ ነው። ደህንነትዎ ይቀድማል። በአሁኑ ጊዜ በጣም የከበደዎ ምንድን ነው?"],
+        'om': ["Amma barumsi sitti ulfaachuun ni hubatama. Nageenyi kee dursa. Amma maaltu caalaa sitti cime?"],
+        'ti': ["ሕጂ ትምህርቲ ምኽባዱ ርዱእ እዩ። ድሕንነትካ ይቕድም። ሕጂ ብዝያዳ ዝኸበደካ እንታይ እዩ?"]
+    },
+    'fear': {
+        'en': ["Feeling scared makes sense, and it is safe to share it here. What are you most afraid of right now?"],
+        'am': ["መፍራትዎ የሚገባ ነው፣ እዚህ በነጻነት መናገር ይችላሉ። በጣም የሚያስፈራዎ ምንድን ነው?"],
+        'om': ["Sodaachuun kee ni hubatama, asitti bilisaan dubbachuu dandeessa. Maaltu caalaa si sodaachisa?"],
+        'ti': ["ምፍራሕካ ርዱእ እዩ፣ ኣብዚ ብናጽነት ክትዛረብ ትኽእል ኢኻ። ብዝያዳ ዘፍርሓካ እንታይ እዩ?"]
+    },
+    'alone': {
+        'en': ["You're not alone in this, even if it feels that way. I'm here with you. Would you like to share more?"],
+        'am': ["በዚህ ብቻዎን አይደሉም። እዚህ ከእርስዎ ጋር ነኝ። ተጨማሪ ማጋራት ይፈልጋሉ?"],
+        'om': ["Kana keessatti kophaa kee hin jirtu. Asuma si waliin jira. Dabalataan natti himuu barbaaddaa?"],
+        'ti': ["ኣብዚ ንበይንኻ ኣይኮንካን። ኣብዚ ምሳኻ ኣለኹ። ተወሳኺ ከተካፍለኒ ትደሊ ዶ?"]
+    },
+}
+
+
+class LocalReplies:
+    """Short supportive replies chosen on the worker's CPU, without any model call
+
+    The reply follows the topic the message hints at (sleep, family, school...), in the
+    given language, and falls back to a general reply of support.
+    """
+
+    def __init__(self, cues=REPLY_CUES, replies=LOCAL_REPLIES, rng: Optional[random.Random] = None):
+        self.cues = cues
+        self.replies = replies
+        self._rng = rng or random.Random()
+
+    def topic(self, message: str, language: str) -> str:
+        text = normalize_text(message)
+        for topic, cues in self.cues.items():
+            if any(cue in text for cue in cues.get(language, [])):
+                return topic
+        return 'general'
+
+    def general(self, language: str) -> str:
+        """A general reply of support, whatever the message"""
+        language = language if language in self.replies['general'] else 'en'
+        return self._rng.choice(self.replies['general'][language])
+
+    def reply(self, message: str, language: str) -> str:
+        language = language if language in self.replies['general'] else 'en'
+        return self._rng.choice(self.replies[self.topic(message, language)][language])
@@ -0,0 +1,224 @@
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+# Name -> (type, help). Label values are always chosen by the code (stage, path, outcome),
+# never taken from a request, so no message content can end up in a metric
+METRICS = {
+    'alem_request_duration_seconds': ('histogram', 'Time to serve a chat request by endpoint'),
+    'alem_stage_duration_seconds': ('histogram', 'Time spent in each stage of a chat turn'),
+    'alem_llm_calls_total': ('counter', 'Gemini calls by stage and outcome'),
+    'alem_llm_hedges_total': ('counter', 'Hedged duplicate Gemini calls by stage'),
+    'alem_llm_coalesced_total': ('counter', 'Gemini calls served by an identical in-flight call, by stage'),
+    'alem_llm_call_duration_seconds': ('histogram', 'Duration of successful Gemini calls by stage'),
+    'alem_llm_tokens_total': ('counter', 'Tokens reported by Gemini by stage and kind'),
+    'alem_responses_total': ('counter', 'Chat replies by the path that produced them'),
+    'alem_backend_reroutes_total': ('counter', 'Stages served by their fallback model backend, by stage'),
+    'alem_errors_total': ('counter', 'Errors caught while serving chat requests'),
+}
+
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_BUCKET_LABELS = tuple(f'{bound:g}' for bound in HISTOGRAM_BUCKETS) + ('+Inf',)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Values recorded by the request being served, while something is capturing them
+_captured: contextvars.ContextVar[Optional[List]] = contextvars.ContextVar('captured_metrics', default=None)
+
+
+class MetricsRegistry:
+    """Counters and histograms kept in process memory, exported in Prometheus text format
+
+    Recording is a dict update under a lock. With a metrics directory configured, each
+    process periodically writes its values to its own file there, and rendering merges
+    the files, so a scrape of any gunicorn worker covers all of them.
+    """
+
+    def __init__(self, directory: Optional[str] = Config.METRICS_DIR,
+                 flush_seconds: float = Config.METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._pid = None
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _ensure_process(self):
+        # Values inherited from the gunicorn master belong to the master, so a forked
+        # worker starts from zero and runs its own flusher
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._counters = {}
+            self._histograms = {}
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+            self._pid = os.getpid()
+
+    # Recording
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Key:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        self._ensure_process()
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((name, labels, amount))
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        self._ensure_process()
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((name, labels, value))
+        key = self._key(name, labels)
+        index = bisect.bisect_left(HISTOGRAM_BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                histogram = self._histograms[key] = [0] * (len(HISTOGRAM_BUCKETS) + 3)
+            histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def capture(self):
+        """Also collect what is recorded inside the block, as (name, labels, value) tuples
+
+        Only values recorded by the calling thread or task are collected, so background
+        work such as summaries is left out.
+        """
+        records = []
+        token = _captured.set(records)
+        try:
+            yield records
+        finally:
+            _captured.reset(token)
+
+    def stage(self, stage: str):
+        """Time a stage of a chat turn"""
+        return self.timer('alem_stage_duration_seconds', stage=stage)
+
+    def record_usage(self, stage: str, response):
+        """Count the tokens Gemini reports for a response, if it reports any"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        if prompt_tokens:
+            self.inc('alem_llm_tokens_total', prompt_tokens, stage=stage, kind='prompt')
+        if output_tokens:
+            self.inc('alem_llm_tokens_total', output_tokens, stage=stage, kind='output')
+
+    # Sharing between processes
+
+    def _snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this process's values to its file in the metrics directory"""
+        if not self.directory or self._pid != os.getpid():
+            return
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(path, os.path.join(self.directory, f'metrics-{os.getpid()}.json'))
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _collect(self) -> Tuple[Dict[Key, float], Dict[Key, list]]:
+        snapshots = [self._snapshot()]
+        if self.directory:
+            self.flush()
+            own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Being replaced or removed right now
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+        return counters, histograms
+
+    # Exposition
+
+    @staticmethod
+    def _labels(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = tuple(labels) + extra
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    def render(self) -> str:
+        """All metrics, merged across worker processes, in Prometheus text format"""
+        counters, histograms = self._collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{self._labels(labels)} {value:g}')
+                continue
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(_BUCKET_LABELS, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, (("le", bound),))} {cumulative:g}')
+                lines.append(f'{name}_sum{self._labels(labels)} {values[-2]:g}')
+                lines.append(f'{name}_count{self._labels(labels)} {values[-1]:g}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every module of the process
+metrics = MetricsRegistry()
@@ -0,0 +1,383 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from gemini_integration import GeminiChat
+from keyword_matcher import KeywordHits
+from language_detection import LanguageDetector
+from llm_gateway import llm_gateway
+from metrics import metrics
+
+
+class ModelBackend(ABC):
+    """Source of the model output of a chat turn: language detection and reply generation
+
+    Replies follow GeminiChat's contract: a crisis message gets the crisis response, and
+    streams yield 'crisis', 'token', 'fallback' and 'resources' events.
+    """
+
+    name = None
+
+    def healthy(self) -> bool:
+        """Whether the backend can be expected to answer promptly right now"""
+        return True
+
+    @abstractmethod
+    def detect_language(self, text: str) -> str:
+        """Language code of the text, one of Config.SUPPORTED_LANGUAGES"""
+
+    async def detect_language_async(self, text: str) -> str:
+        return self.detect_language(text)
+
+    def detect_languages(self, texts: List[str]) -> List[str]:
+        return [self.detect_language(text) for text in texts]
+
+    @abstractmethod
+    def generate_reply(self, message: str, language: str, conversation_history: List[str],
+                       hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                       student_messages: Optional[int] = None) -> str:
+        """Reply to the student's message, the last entry of conversation_history"""
+
+    async def generate_reply_async(self, message: str, language: str, conversation_history: List[str],
+                                   hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                   student_messages: Optional[int] = None) -> str:
+        return self.generate_reply(message, language, conversation_history, hits, summary, student_messages)
+
+    @abstractmethod
+    def generate_reply_stream(self, message: str, language: str, conversation_history: List[str],
+                              hits: Optional[KeywordHits] = None,
+                              summary: Optional[str] = None,
+                              student_messages: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """Same reply as generate_reply, as (event, text) pairs"""
+
+    async def generate_reply_stream_async(self, message: str, language: str, conversation_history: List[str],
+                                          hits: Optional[KeywordHits] = None,
+                                          summary: Optional[str] = None,
+                                          student_messages: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        for event in self.generate_reply_stream(message, language, conversation_history, hits, summary,
+                                                student_messages):
+            yield event
+
+
+class GeminiBackend(ModelBackend):
+    """Gemini through the LLM gateway
+
+    Unhealthy while the circuit is open or the gateway queue is full. Once the circuit's
+    cool-down has passed it is healthy again, so the breaker's trial call reaches Gemini.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, gemini_chat: GeminiChat, language_detector: LanguageDetector):
+        self.gemini_chat = gemini_chat
+        self.language_detector = language_detector
+
+    def healthy(self) -> bool:
+        return llm_gateway.caller.breaker.would_allow() and llm_gateway.queue_depth() < llm_gateway.max_queue
+
+    def detect_language(self, text: str) -> str:
+        return self.language_detector.detect_language(text)
+
+    async def detect_language_async(self, text: str) -> str:
+        return await self.language_detector.detect_language_async(text)
+
+    def detect_languages(self, texts: List[str]) -> List[str]:
+        return self.language_detector.detect_languages(texts)
+
+    def generate_reply(self, message: str, language: str, conversation_history: List[str],
+                       hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                       student_messages: Optional[int] = None) -> str:
+        return self.gemini_chat.generate_response(
+            message, language, conversation_history, hits, summary, student_messages)
+
+    async def generate_reply_async(self, message: str, language: str, conversation_history: List[str],
+                                   hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                   student_messages: Optional[int] = None) -> str:
+        return await self.gemini_chat.generate_response_async(
+            message, language, conversation_history, hits, summary, student_messages)
+
+    def generate_reply_stream(self, message: str, language: str, conversation_history: List[str],
+                              hits: Optional[KeywordHits] = None,
+                              summary: Optional[str] = None,
+                              student_messages: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        return self.gemini_chat.generate_response_stream(
+            message, language, conversation_history, hits, summary, student_messages)
+
+    def generate_reply_stream_async(self, message: str, language: str, conversation_history: List[str],
+                                    hits: Optional[KeywordHits] = None,
+                                    summary: Optional[str] = None,
+                                    student_messages: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        return self.gemini_chat.generate_response_stream_async(
+            message, language, conversation_history, hits, summary, student_messages)
+
+
+class LocalBackend(ModelBackend):
+    """Runs on the worker's CPU with no network call
+
+    Detection takes the local n-gram detector's best guess; replies are short supportive
+    messages picked by language and topic. Crisis messages still get the crisis response.
+    """
+
+    name = 'local'
+
+    def __init__(self, gemini_chat: GeminiChat, language_detector: LanguageDetector):
+        self.gemini_chat = gemini_chat
+        self.language_detector = language_detector
+
+    def detect_language(self, text: str) -> str:
+        resolved, local_guess = self.language_detector.detect_language_locally(text)
+        return resolved or local_guess or Config.DEFAULT_LANGUAGE
+
+    def generate_reply(self, message: str, language: str, conversation_history: List[str],
+                       hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                       student_messages: Optional[int] = None) -> str:
+        crisis_response = self.gemini_chat.crisis_response(message, language, hits)
+        if crisis_response:
+            return crisis_response
+        metrics.inc('alem_responses_total', path='local')
+        return (self.gemini_chat.local_replies.reply(message, language) +
+                (self.gemini_chat.practical_resources(message, language) or ''))
+
+    def generate_reply_stream(self, message: str, language: str, conversation_history: List[str],
+                              hits: Optional[KeywordHits] = None,
+                              summary: Optional[str] = None,
+                              student_messages: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        crisis_response = self.gemini_chat.crisis_response(message, language, hits)
+        if crisis_response:
+            yield 'crisis', crisis_response
+            return
+        metrics.inc('alem_responses_total', path='local')
+        yield 'token', self.gemini_chat.local_replies.reply(message, language)
+        resources = self.gemini_chat.practical_resources(message, language)
+        if resources:
+            yield 'resources', resources
+
+
+class LlamaCppBackend(ModelBackend):
+    """A small quantized model run on the worker's CPU through llama-cpp-python
+
+    The model is loaded once per worker process on first use. A llama.cpp context serves
+    one completion at a time, so calls take turns on it; detection of many texts goes out
+    as one batched prompt, as with Gemini. Replies use GeminiChat's system instruction,
+    contents and generation profile, capped at LOCAL_MODEL_MAX_TOKENS. Crisis messages
+    still get the crisis response, and whatever the model fails to answer is answered by
+    the canned local backend. Unhealthy once the model fails to load.
+    """
+
+    name = 'llama_cpp'
+
+    def __init__(self, gemini_chat: GeminiChat, language_detector: LanguageDetector, fallback: ModelBackend,
+                 model_path: Optional[str] = Config.LOCAL_MODEL_PATH):
+        self.gemini_chat = gemini_chat
+        self.language_detector = language_detector
+        self.fallback = fallback
+        self.model_path = model_path
+        self._llama = None
+        self._llama_pid = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    def _model(self):
+        # Loaded lazily and again after a fork: gunicorn preloads the app in the master
+        if self._llama_pid != os.getpid():
+            with self._lock:
+                if self._llama_pid != os.getpid():
+                    try:
+                        from llama_cpp import Llama
+
+                        self._llama = Llama(model_path=self.model_path, n_ctx=Config.LOCAL_MODEL_CONTEXT_TOKENS,
+                                            n_threads=Config.LOCAL_MODEL_THREADS, verbose=False)
+                        self._load_error = None
+                    except Exception as e:
+                        logging.error(f"Error loading local model: {str(e)}")
+                        self._llama, self._load_error = None, e
+                    self._llama_pid = os.getpid()
+        if self._llama is None:
+            raise RuntimeError(f"Local model unavailable: {self._load_error}")
+        return self._llama
+
+    def healthy(self) -> bool:
+        return self._llama_pid != os.getpid() or self._llama is not None
+
+    def _complete(self, prompt: str, max_tokens: int) -> str:
+        model = self._model()
+        with self._lock:
+            result = model.create_completion(prompt, max_tokens=max_tokens, temperature=0)
+        return result['choices'][0]['text']
+
+    def detect_language(self, text: str) -> str:
+        return self.detect_languages([text])[0]
+
+    async def detect_language_async(self, text: str) -> str:
+        return await asyncio.to_thread(self.detect_language, text)
+
+    def detect_languages(self, texts: List[str]) -> List[str]:
+        results, unresolved = [], {}
+        for index, text in enumerate(texts):
+            resolved, local_guess = self.language_detector.detect_language_locally(text)
+            results.append(resolved or local_guess or Config.DEFAULT_LANGUAGE)
+            if not resolved:
+                unresolved.setdefault(text, []).append(index)
+        if not unresolved:
+            return results
+
+        pending = list(unresolved)
+        try:
+            if len(pending) == 1:
+                codes = [self._complete(Config.LANGUAGE_DETECTION_PROMPT.format(text=pending[0]), 4)]
+            else:
+                numbered = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}"
+                                     for i, text in enumerate(pending, 1))
+                response = self._complete(Config.LANGUAGE_DETECTION_BATCH_PROMPT.format(texts=numbered),
+                                          8 * len(pending) + 8)
+                match = re.search(r'\[.*\]', response, re.DOTALL)
+                codes = json.loads(match.group(0)) if match else None
+                if not isinstance(codes, list) or len(codes) != len(pending):
+                    raise ValueError(f"Expected {len(pending)} language codes")
+        except Exception as e:
+            logging.error(f"Local model language detection error: {str(e)}")
+            metrics.inc('alem_errors_total', where='detection')
+            return results
+
+        for text, code in zip(pending, codes):
+            code = str(code).strip().strip("'\"").lower()
+            if code in Config.SUPPORTED_LANGUAGES:
+                for index in unresolved[text]:
+                    results[index] = code
+        return results
+
+    def _messages(self, message: str, language: str, conversation_history: List[str],
+                  hits: Optional[KeywordHits], summary: Optional[str],
+                  student_messages: Optional[int]) -> Tuple[List[Dict], Dict]:
+        crisis_indicators = self.gemini_chat._detect_crisis(message, language, hits)
+        contents = self.gemini_chat._build_contents(message, language, conversation_history, crisis_indicators,
+                                                    summary)
+        messages = [{'role': 'system', 'content': self.gemini_chat._system_instruction(language)}]
+        messages += [{'role': 'assistant' if content['role'] == 'model' else 'user', 'content': content['parts'][0]}
+                     for content in contents]
+        profile = Config.GENERATION_PROFILES[
+            self.gemini_chat._generation_profile(conversation_history, crisis_indicators, student_messages)]
+        settings = {'max_tokens': min(profile['max_output_tokens'], Config.LOCAL_MODEL_MAX_TOKENS),
+                    'temperature': profile['temperature']}
+        return messages, settings
+
+    def generate_reply(self, message: str, language: str, conversation_history: List[str],
+                       hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                       student_messages: Optional[int] = None) -> str:
+        crisis_response = self.gemini_chat.crisis_response(message, language, hits)
+        if crisis_response:
+            return crisis_response
+        try:
+            messages, settings = self._messages(message, language, conversation_history, hits, summary,
+                                                student_messages)
+            model = self._model()
+            with self._lock:
+                result = model.create_chat_completion(messages=messages, **settings)
+            generated_text = result['choices'][0]['message']['content'] or ''
+        except Exception as e:
+            logging.error(f"Error generating local model response: {str(e)}")
+            metrics.inc('alem_errors_total', where='local_model')
+            generated_text = ''
+        if len(generated_text.strip()) < 10:
+            return self.fallback.generate_reply(message, language, conversation_history, hits, summary,
+                                                student_messages)
+        metrics.inc('alem_responses_total', path='local_model')
+        return generated_text.strip() + (self.gemini_chat.practical_resources(message, language) or '')
+
+    async def generate_reply_async(self, message: str, language: str, conversation_history: List[str],
+                                   hits: Optional[KeywordHits] = None, summary: Optional[str] = None,
+                                   student_messages: Optional[int] = None) -> str:
+        return await asyncio.to_thread(self.generate_reply, message, language, conversation_history, hits, summary,
+                                       student_messages)
+
+    def generate_reply_stream(self, message: str, language: str, conversation_history: List[str],
+                              hits: Optional[KeywordHits] = None,
+                              summary: Optional[str] = None,
+                              student_messages: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        crisis_response = self.gemini_chat.crisis_response(message, language, hits)
+        if crisis_response:
+            yield 'crisis', crisis_response
+            return
+
+        generated_text = ""
+        try:
+            messages, settings = self._messages(message, language, conversation_history, hits, summary,
+                                                student_messages)
+            model = self._model()
+            # The context stays taken until the stream is exhausted or closed
+            with self._lock:
+                for chunk in model.create_chat_completion(messages=messages, stream=True, **settings):
+                    text = chunk['choices'][0]['delta'].get('content')
+                    if text:
+                        generated_text += text
+                        yield 'token', text
+        except Exception as e:
+            logging.error(f"Error streaming local model response: {str(e)}")
+            metrics.inc('alem_errors_total', where='local_model')
+            generated_text = ""
+
+        if len(generated_text.strip()) < 10:
+            yield 'fallback', self.fallback.generate_reply(message, language, conversation_history, hits, summary,
+                                                           student_messages)
+            return
+
+        metrics.inc('alem_responses_total', path='local_model')
+        resources = self.gemini_chat.practical_resources(message, language)
+        if resources:
+            yield 'resources', resources
+
+    async def generate_reply_stream_async(self, message: str, language: str, conversation_history: List[str],
+                                          hits: Optional[KeywordHits] = None,
+                                          summary: Optional[str] = None,
+                                          student_messages: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        stream = self.generate_reply_stream(message, language, conversation_history, hits, summary,
+                                            student_messages)
+        try:
+            while True:
+                event = await asyncio.to_thread(next, stream, None)
+                if event is None:
+                    return
+                yield event
+        finally:
+            await asyncio.to_thread(stream.close)
+
+
+def build_backends(gemini_chat: GeminiChat, language_detector: LanguageDetector) -> Dict[str, ModelBackend]:
+    """The backends available to the router; llama_cpp only once LOCAL_MODEL_PATH is set"""
+    local = LocalBackend(gemini_chat, language_detector)
+    backends = {'gemini': GeminiBackend(gemini_chat, language_detector), 'local': local}
+    if Config.LOCAL_MODEL_PATH:
+        backends['llama_cpp'] = LlamaCppBackend(gemini_chat, language_detector, local)
+    return backends
+
+
+class ModelRouter:
+    """Picks the backend serving each stage of a turn
+
+    A stage runs on its configured backend, or on its fallback backend while the
+    configured one is unhealthy, e.g. while Gemini's circuit is open or the gateway is
+    shedding load.
+    """
+
+    def __init__(self, backends: Dict[str, ModelBackend], primary: Dict[str, str] = Config.MODEL_BACKENDS,
+                 fallback: Dict[str, Optional[str]] = Config.MODEL_FALLBACK_BACKENDS):
+        for stage, name in list(primary.items()) + [item for item in fallback.items() if item[1]]:
+            if name not in backends:
+                raise ValueError(f"Unknown model backend {name!r} for {stage}")
+        self.backends = backends
+        self.primary = primary
+        self.fallback = fallback
+
+    def backend_for(self, stage: str) -> ModelBackend:
+        backend = self.backends[self.primary[stage]]
+        fallback = self.fallback.get(stage)
+        if fallback and fallback != backend.name and not backend.healthy():
+            metrics.inc('alem_backend_reroutes_total', stage=stage, backend=fallback)
+            return self.backends[fallback]
+        return backend
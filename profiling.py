@@ -0,0 +1,190 @@
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Optional, TypeVar
+
+from config import Config
+
+T = TypeVar('T')
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Profile of the request being served, if it is profiled
+_active: contextvars.ContextVar[Optional['RequestProfile']] = contextvars.ContextVar('request_profile', default=None)
+
+
+def follow_request(fn: Callable[[], T]) -> Callable[[], T]:
+    """Have fn profiled with the current request on whichever thread ends up running it"""
+    profile = _active.get()
+    if profile is None:
+        return fn
+    return lambda: profile.run(fn)
+
+
+class RequestProfile:
+    """cProfile data of one request, gathered from its own thread and the gateway workers it used"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.main = cProfile.Profile()
+        self._others = []
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[[], T]) -> T:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler, which already sees every thread
+            return fn()
+        try:
+            return fn()
+        finally:
+            profile.disable()
+            with self._lock:
+                self._others.append(profile)
+
+    def dump(self, directory: str) -> str:
+        stats = pstats.Stats(self.main)
+        with self._lock:
+            for profile in self._others:
+                stats.add(profile)
+        path = os.path.join(directory, f'{self.request_id}.prof')
+        stats.dump_stats(path)
+        return path
+
+
+class ProfilingMiddleware:
+    """Runs chosen requests under cProfile and stores one pstats file per request ID
+
+    A request is profiled when it carries an X-Profile header matching PROFILE_TOKEN, or
+    when it falls in the PROFILE_SAMPLE_RATE sample. The request ID is taken from
+    X-Request-ID when it is a safe file name, otherwise generated, and returned in the
+    X-Profile-Id response header. Gemini calls the request makes on gateway workers are
+    profiled with it. app.py only installs this, and only has the gateway wrap its calls
+    with follow_request, when PROFILE_DIR is configured, so unprofiled deployments do not
+    run any of it.
+    """
+
+    def __init__(self, app, directory: str = Config.PROFILE_DIR, token: Optional[str] = Config.PROFILE_TOKEN,
+                 sample_rate: float = Config.PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _wanted(self, header: Optional[str]) -> bool:
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def _request_id(header: Optional[str]) -> str:
+        return header if header and _REQUEST_ID.match(header) else uuid.uuid4().hex
+
+    def __call__(self, environ, start_response):
+        # One profiled request at a time per process; others meanwhile run unprofiled
+        if not self._wanted(environ.get(PROFILE_HEADER)) or not self._busy.acquire(blocking=False):
+            return self.app(environ, start_response)
+
+        request_id = self._request_id(environ.get(REQUEST_ID_HEADER))
+        profile = RequestProfile(request_id)
+        request = f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}"
+
+        def start_profiled_response(status, headers, exc_info=None):
+            return start_response(status, list(headers) + [('X-Profile-Id', request_id)], exc_info)
+
+        token = _active.set(profile)
+        started = time.perf_counter()
+        try:
+            result = profile.main.runcall(self.app, environ, start_profiled_response)
+        except BaseException:
+            _active.reset(token)
+            self._finish(profile, request, started)
+            raise
+        _active.reset(token)
+        return _ProfiledResponse(result, profile, lambda: self._finish(profile, request, started))
+
+    def _finish(self, profile: RequestProfile, request: str, started: float):
+        try:
+            path = profile.dump(self.directory)
+        except OSError as e:
+            logging.error(f"Error writing request profile: {str(e)}")
+            return
+        finally:
+            self._busy.release()
+        logging.info(f"Profiled {request} in {time.perf_counter() - started:.3f}s: {path}")
+
+
+class AsyncProfilingMiddleware(ProfilingMiddleware):
+    """ProfilingMiddleware for an ASGI app, e.g. the async /api/chat in asgi.py
+
+    The profiler runs on the event loop thread from the start of the request to its
+    response, so the profile also holds whatever other requests ran on the loop meanwhile.
+    """
+
+    async def __call__(self, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        if not self._wanted(headers.get('x-profile')) or not self._busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        request_id = self._request_id(headers.get('x-request-id'))
+        profile = RequestProfile(request_id)
+
+        async def send_profiled(message):
+            if message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers', [])) +
+                               [(b'x-profile-id', request_id.encode('latin-1'))])
+            await send(message)
+
+        token = _active.set(profile)
+        started = time.perf_counter()
+        profile.main.enable()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            profile.main.disable()
+            _active.reset(token)
+            self._finish(profile, f"{scope['method']} {scope['path']}", started)
+
+
+class _ProfiledResponse:
+    """Response body whose iteration, e.g. a streamed reply, is profiled too"""
+
+    def __init__(self, result: Iterable[bytes], profile: RequestProfile, finish: Callable[[], None]):
+        self._result = result
+        self._profile = profile
+        self._finish = finish
+
+    def __iter__(self):
+        iterator = iter(self._result)
+        while True:
+            token = _active.set(self._profile)
+            self._profile.main.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._profile.main.disable()
+                _active.reset(token)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._result, 'close'):
+                self._profile.main.runcall(self._result.close)
+        finally:
+            self._finish()
@@ -0,0 +1,329 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from config import Config
+from metrics import metrics
+
+T = TypeVar('T')
+
+
+class LLMUnavailableError(Exception):
+    """Raised instead of calling Gemini when the call cannot finish in time or upstream is failing"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class DeadlineExceededError(LLMUnavailableError):
+    pass
+
+
+class GatewayOverloadedError(LLMUnavailableError):
+    """The LLM gateway queue is full; the caller sheds load with its canned fallback"""
+
+
+class CallSupersededError(LLMUnavailableError):
+    """A newer message of the same conversation made the result of the call unnecessary"""
+
+
+# Absolute monotonic deadline of the request being served, if any
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('request_deadline', default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float = Config.LLM_REQUEST_DEADLINE_SECONDS):
+    """Bound the total time every Gemini call made inside the block may take"""
+    token = _request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+# Resolved once the turn being served is superseded by a newer one, if it can be
+_superseded: contextvars.ContextVar[Optional[Future]] = contextvars.ContextVar('superseded', default=None)
+
+
+@contextmanager
+def supersedable(signal: Future):
+    """Abandon the Gemini calls made inside the block as soon as signal is resolved
+
+    Queued calls are dropped; a call already running upstream finishes on its gateway
+    worker, but nobody waits for it.
+    """
+    token = _superseded.set(signal)
+    try:
+        yield
+    finally:
+        _superseded.reset(token)
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, DeadlineExceededError):
+        return 'timeout'
+    if isinstance(error, GatewayOverloadedError):
+        return 'shed'
+    if isinstance(error, (asyncio.CancelledError, CallSupersededError)):
+        return 'cancelled'
+    return 'error'
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations for one stage"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < Config.LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after a cool-down a single trial call is let through"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def would_allow(self) -> bool:
+        """Whether allow() would let a call through now, without claiming the trial"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            return not self._trial_in_flight and time.monotonic() - self._opened_at >= self.reset_seconds
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def abandon_trial(self):
+        """Release a trial call that ended without telling anything about upstream health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logging.warning("Gemini circuit breaker opened; serving fallback responses")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ResilientCaller:
+    """Runs Gemini calls under per-stage timeouts, the request deadline, hedging and a circuit breaker
+
+    Calls are passed as functions of the timeout they have left, so the timeout also
+    reaches the client library (request_options) and abandoned calls do not linger.
+    They are run through the gateway, which bounds concurrency and orders them by priority.
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.breaker = CircuitBreaker(Config.LLM_CIRCUIT_FAILURE_THRESHOLD, Config.LLM_CIRCUIT_RESET_SECONDS)
+        self._latency = {}
+
+    def _tracker(self, stage: str) -> LatencyTracker:
+        tracker = self._latency.get(stage)
+        if tracker is None:
+            tracker = self._latency.setdefault(stage, LatencyTracker())
+        return tracker
+
+    def _timeout(self, stage: str) -> float:
+        timeout = Config.LLM_STAGE_TIMEOUTS.get(stage, Config.LLM_STAGE_TIMEOUTS['generation'])
+        deadline = _request_deadline.get()
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceededError(f"No time left for {stage}")
+        return timeout
+
+    def _hedge_delay(self, stage: str) -> Optional[float]:
+        if stage not in Config.LLM_HEDGE_STAGES:
+            return None
+        p95 = self._tracker(stage).percentile(0.95)
+        if p95 is None:
+            return None
+        return max(p95, Config.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    def _admit(self, stage: str) -> float:
+        timeout = self._timeout(stage)
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Gemini circuit open, skipping {stage}")
+        return timeout
+
+    def _succeeded(self, stage: str, started: float):
+        elapsed = time.monotonic() - started
+        self._tracker(stage).record(elapsed)
+        metrics.observe('alem_llm_call_duration_seconds', elapsed, stage=stage)
+        self.breaker.record_success()
+
+    @staticmethod
+    def _counted(stage: str, error: Optional[BaseException] = None, result=None):
+        metrics.inc('alem_llm_calls_total', stage=stage, outcome=_outcome(error) if error else 'ok')
+        # A stream's usage is only final once it has been consumed; GeminiChat records it then
+        if error is None and stage != 'stream':
+            metrics.record_usage(stage, result)
+
+    def call(self, stage: str, fn: Callable[[float], T], priority: int) -> T:
+        """Run fn(timeout) on the gateway, hedging with a duplicate past the stage's p95"""
+        try:
+            result = self._call(stage, fn, priority)
+        except BaseException as e:
+            self._counted(stage, e)
+            raise
+        self._counted(stage, result=result)
+        return result
+
+    async def call_async(self, stage: str, fn: Callable[[float], Awaitable[T]], priority: int) -> T:
+        """Async counterpart of call for coroutine-returning Gemini calls"""
+        try:
+            result = await self._call_async(stage, fn, priority)
+        except BaseException as e:
+            self._counted(stage, e)
+            raise
+        self._counted(stage, result=result)
+        return result
+
+    def _call(self, stage: str, fn: Callable[[float], T], priority: int) -> T:
+        signal = _superseded.get()
+        watched = [signal] if signal is not None else []
+        if signal is not None and signal.done():
+            raise CallSupersededError(f"{stage} superseded before it started")
+        timeout = self._admit(stage)
+        started = time.monotonic()
+        end = started + timeout
+        futures = []
+        error = None
+        try:
+            futures.append(self.gateway.submit(fn, timeout, priority))
+            hedge_delay = self._hedge_delay(stage)
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = wait(futures + watched, timeout=hedge_delay)
+                if signal in done:
+                    raise CallSupersededError(f"{stage} superseded")
+                if not done:
+                    try:
+                        futures.append(self.gateway.submit(fn, end - time.monotonic(), priority))
+                        metrics.inc('alem_llm_hedges_total', stage=stage)
+                    except GatewayOverloadedError:
+                        pass  # No room for a hedge; keep waiting on the first call
+
+            while futures:
+                done, pending = wait(futures + watched, timeout=max(end - time.monotonic(), 0),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceededError(f"{stage} timed out after {timeout:.1f}s")
+                if signal in done:
+                    raise CallSupersededError(f"{stage} superseded")
+                pending = [future for future in pending if future is not signal]
+                for future in done:
+                    if future.exception() is None:
+                        self._succeeded(stage, started)
+                        for other in pending:
+                            other.cancel()
+                        return future.result()
+                    error = future.exception()
+                futures = list(pending)
+            raise error
+        except GatewayOverloadedError:
+            # Shed locally; says nothing about upstream health
+            self.breaker.abandon_trial()
+            raise
+        except CallSupersededError:
+            for future in futures:
+                future.cancel()
+            self.breaker.abandon_trial()
+            raise
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            self.breaker.record_failure()
+            raise
+
+    async def _call_async(self, stage: str, fn: Callable[[float], Awaitable[T]], priority: int) -> T:
+        timeout = self._admit(stage)
+        started = time.monotonic()
+        end = started + timeout
+
+        async def attempt(remaining: float) -> T:
+            async with self.gateway.slot(priority):
+                return await fn(remaining)
+
+        tasks = [asyncio.ensure_future(attempt(timeout))]
+        hedge_delay = self._hedge_delay(stage)
+        error = None
+        try:
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    tasks.append(asyncio.ensure_future(attempt(end - time.monotonic())))
+                    metrics.inc('alem_llm_hedges_total', stage=stage)
+
+            while tasks:
+                done, pending = await asyncio.wait(tasks, timeout=max(end - time.monotonic(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceededError(f"{stage} timed out after {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        self._succeeded(stage, started)
+                        for other in pending:
+                            other.cancel()
+                        return task.result()
+                    error = task.exception()
+                    if isinstance(error, GatewayOverloadedError) and not pending:
+                        raise error
+                tasks = list(pending)
+            raise error
+        except (asyncio.CancelledError, GatewayOverloadedError):
+            # Superseded (e.g. a cancelled speculative generation) or shed locally,
+            # neither of which says anything about upstream health
+            for task in tasks:
+                task.cancel()
+            self.breaker.abandon_trial()
+            raise
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            self.breaker.record_failure()
+            raise
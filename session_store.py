@@ -0,0 +1,139 @@
+import copy
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from config import Config
+
+
+def new_session_id() -> str:
+    """Opaque, unguessable identifier carried in the session cookie"""
+    return secrets.token_urlsafe(32)
+
+
+class SessionStore(ABC):
+    """Server-side conversation state keyed by session ID, expiring after a TTL"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict]:
+        """The stored state, or None if the session is unknown or expired"""
+
+    @abstractmethod
+    def set(self, session_id: str, state: Dict):
+        """Store the state, replacing any earlier one"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget the session"""
+
+    def load(self, session_id: Optional[str]) -> Dict:
+        """Return the state for a session, or an empty state if it is unknown or expired"""
+        if not session_id:
+            return {}
+        return self.get(session_id) or {}
+
+    def save(self, session_id: str, state: Dict):
+        """Store the state, purging the entry when the state was wiped"""
+        if state:
+            self.set(session_id, state)
+        else:
+            self.delete(session_id)
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU with TTL expiry; only suitable for a single worker process"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._cache.get(session_id)
+        # Copies keep concurrent requests of one session from mutating a shared dict
+        return copy.deepcopy(state) if state is not None else None
+
+    def set(self, session_id: str, state: Dict):
+        state = copy.deepcopy(state)
+        with self._lock:
+            self._cache[session_id] = state
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store shared by every worker process on the host"""
+
+    # Expired and excess rows are purged once every this many writes
+    PURGE_INTERVAL = 200
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'session_id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not cross a fork, so each worker process and thread opens its own
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            'SELECT state FROM sessions WHERE session_id = ? AND expires_at > ?',
+            (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, state: Dict):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (session_id, state, expires_at) VALUES (?, ?, ?)',
+            (session_id, json.dumps(state, ensure_ascii=False), time.time() + self.ttl_seconds)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self._purge(conn)
+
+    def delete(self, session_id: str):
+        self._connection().execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def _purge(self, conn: sqlite3.Connection):
+        conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+        # Bound the table by dropping the sessions closest to expiry, i.e. the least recently used
+        conn.execute(
+            'DELETE FROM sessions WHERE session_id IN ('
+            'SELECT session_id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+
+def create_session_store() -> SessionStore:
+    """Build the session backend selected by Config.SESSION_BACKEND"""
+    if Config.SESSION_BACKEND == 'sqlite':
+        return SQLiteSessionStore(Config.SESSION_SQLITE_PATH, Config.SESSION_MAX_ENTRIES,
+                                  Config.SESSION_TTL_SECONDS)
+    if Config.SESSION_BACKEND == 'memory':
+        return MemorySessionStore(Config.SESSION_MAX_ENTRIES, Config.SESSION_TTL_SECONDS)
+    raise ValueError(f"Unknown session backend: {Config.SESSION_BACKEND}")
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from resilience import CallSupersededError
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one call and its result
+
+    The first caller for a key runs the call; callers arriving while it is in flight
+    wait for its outcome instead of making their own. Successful results can also be
+    kept for a short window, so repeats right after the call finished share it too.
+    """
+
+    def __init__(self, windows: Optional[Dict[str, float]] = None):
+        # Seconds a successful result stays shareable after the call finished, by stage
+        self.windows = windows or {}
+        self._calls = {}
+        self._tasks = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def _recent_result(self, key):
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._recent[key]
+            return None
+        return entry
+
+    def _remember(self, stage: str, key, result):
+        window = self.windows.get(stage, 0)
+        if window > 0:
+            with self._lock:
+                now = time.monotonic()
+                # Windows are short, so expired entries are swept here rather than on a timer
+                for stale in [k for k, (expires_at, _) in self._recent.items() if expires_at < now]:
+                    del self._recent[stale]
+                self._recent[key] = (now + window, result)
+
+    def do(self, stage: str, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Run fn once per key in flight; returns the result and whether it was shared
+
+        A caller sharing a call whose leader was superseded runs it again rather than
+        passing the leader's CallSupersededError on to its own turn.
+        """
+        key = (stage, key)
+        while True:
+            with self._lock:
+                recent = self._recent_result(key)
+                if recent is not None:
+                    return recent[1], True
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except CallSupersededError:
+                # The leader's own turn was superseded, not this caller's: run the call again
+                continue
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            self._remember(stage, key, result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, stage: str, key: Hashable,
+                       fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Async counterpart of do; the shared call is cancelled only once all its callers are"""
+        key = (stage, key)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            recent = self._recent_result(key)
+            if recent is not None:
+                return recent[1], True
+            entry = self._tasks.get(key)
+            shared = entry is not None and entry['loop'] is loop
+            if not shared:
+                task = asyncio.ensure_future(fn())
+                entry = self._tasks[key] = {'loop': loop, 'task': task, 'waiters': 0}
+                task.add_done_callback(lambda _: self._forget_task(key, entry))
+            entry['waiters'] += 1
+
+        task = entry['task']
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            entry['waiters'] -= 1
+            if entry['waiters'] == 0:
+                self._forget_task(key, entry)
+                task.cancel()
+            raise
+        if not shared:
+            self._remember(stage, key, result)
+        return result, shared
+
+    def _forget_task(self, key, entry):
+        with self._lock:
+            if self._tasks.get(key) is entry:
+                del self._tasks[key]
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import unittest
+
+from chat_pipeline import STATE_KEYS
+from conversation_memory import ConversationMemory
+from session_store import MemorySessionStore
+
+
+class BlockingSummarizer:
+    def __init__(self):
+        self.started, self.release = threading.Event(), threading.Event()
+        self.calls = []
+
+    def __call__(self, summary: str, messages):
+        self.calls.append(list(messages))
+        self.started.set()
+        self.release.wait(2)
+        return 'old conversation summary'
+
+
+def _wipe(state):
+    for key in STATE_KEYS:
+        state.pop(key, None)
+
+
+class WipeDuringSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.summarizer = BlockingSummarizer()
+        self.memory = ConversationMemory(self.summarizer, history_token_budget=20)
+        self.store = MemorySessionStore(max_entries=10, ttl_seconds=60)
+
+    def _fill(self, state, prefix: str, count: int):
+        for index in range(count):
+            self.memory.add(state, f'{prefix} message number {index} with a few more words in it')
+
+    def test_summary_is_not_written_into_the_next_conversation(self):
+        state = {}
+        self._fill(state, 'old', 6)
+        self.store.save('sid', state)
+        self.memory.schedule_summary(self.store, 'sid', state)
+        self.assertTrue(self.summarizer.started.wait(2))
+
+        # Handover wipes the state; the next message starts a new conversation under the same sid
+        _wipe(state)
+        self._fill(state, 'new', 4)
+        new_pending = list(state['summary_pending'])
+        self.store.save('sid', state)
+
+        self.summarizer.release.set()
+        self.memory._executor.shutdown(wait=True)
+
+        latest = self.store.get('sid')
+        self.assertNotIn('summary', latest)
+        self.assertEqual(latest['summary_pending'], new_pending)
+
+    def test_async_summary_is_dropped_after_a_wipe(self):
+        state = {}
+        self._fill(state, 'old', 6)
+
+        async def run():
+            task = asyncio.ensure_future(self.memory.refresh_summary_async(state))
+            await asyncio.to_thread(self.summarizer.started.wait, 2)
+            _wipe(state)
+            self._fill(state, 'new', 4)
+            pending = list(state['summary_pending'])
+            self.summarizer.release.set()
+            await task
+            return pending
+
+        pending = asyncio.run(run())
+        self.assertNotIn('summary', state)
+        self.assertEqual(state['summary_pending'], pending)
+
+    def test_turns_folded_while_summarizing_stay_pending(self):
+        state = {}
+        self._fill(state, 'old', 6)
+        summarized = list(state['summary_pending'])
+        self.store.save('sid', state)
+        self.memory.schedule_summary(self.store, 'sid', state)
+        self.assertTrue(self.summarizer.started.wait(2))
+
+        self._fill(state, 'later', 4)
+        newer = state['summary_pending'][len(summarized):]
+        self.store.save('sid', state)
+        self.summarizer.release.set()
+        self.memory._executor.shutdown(wait=True)
+
+        latest = self.store.get('sid')
+        self.assertEqual(latest['summary'], 'old conversation summary')
+        self.assertEqual(latest['summary_pending'], newer)
+
+
+class PendingLimitTest(unittest.TestCase):
+    def test_pending_messages_are_capped(self):
+        memory = ConversationMemory(lambda summary, messages: None, history_token_budget=20, pending_limit=6)
+        state = {}
+        for index in range(30):
+            memory.add(state, f'message number {index} with a few more words in it')
+        self.assertEqual(len(state['summary_pending']), 6)
+        self.assertIn('message number 27', state['summary_pending'][-1])
+
+
+class GenerationStageTest(unittest.TestCase):
+    def test_stage_counts_messages_folded_out_of_the_budget(self):
+        from gemini_integration import GeminiChat
+
+        memory = ConversationMemory(lambda summary, messages: None, history_token_budget=60)
+        state = {}
+        for index in range(7):
+            memory.add(state, 'ትናንት ማታ መተኛት አልቻልኩም በጣም ፈርቻለሁ ' * 3)
+        self.assertLessEqual(len(state['conversation_history']), 2)
+        self.assertEqual(memory.student_messages(state), 4)
+
+        no_crisis = {'immediate_danger': False, 'suicidal_ideation': False}
+        self.assertEqual(GeminiChat._generation_profile(state['conversation_history'], no_crisis,
+                                                        memory.student_messages(state)), 'established')
+        self.assertEqual(GeminiChat._generation_profile([], no_crisis, 1), 'first_contact')
+
+
+if __name__ == '__main__':
+    unittest.main()
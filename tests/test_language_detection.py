@@ -0,0 +1,32 @@
+import unittest
+
+from config import Config
+from language_detection import LocalLanguageDetector
+
+
+class LocalLanguageDetectorTest(unittest.TestCase):
+    threshold = Config.LOCAL_DETECTION_CONFIDENCE_THRESHOLD
+
+    def setUp(self):
+        self.detector = LocalLanguageDetector()
+
+    def test_transliterated_text_is_left_to_gemini(self):
+        for text in ('kulu gize ferihe', 'selam, endet neh?', 'betam fercheyalehu', 'entay egber?'):
+            self.assertLess(self.detector.detect(text)[1], self.threshold, text)
+
+    def test_single_words_are_left_to_gemini(self):
+        for text in ('yekenyeley', 'አመሰግናለሁ', 'galatoomi', 'thanks'):
+            self.assertLess(self.detector.detect(text)[1], self.threshold, text)
+
+    def test_sentences_resolve_locally(self):
+        for text, language in [("I couldn't sleep last night and I keep thinking about what happened", 'en'),
+                               ("Maatiin koo yoo beekan maal akka jedhan hin beeku", 'om'),
+                               ("ትናንት ማታ መተኛት አልቻልኩም በጣም ፈርቻለሁ", 'am'),
+                               ("ስድራይ እንተፈሊጦም እንታይ ከም ዝብሉ ኣይፈልጥን", 'ti')]:
+            detected, confidence = self.detector.detect(text)
+            self.assertEqual(detected, language)
+            self.assertGreaterEqual(confidence, self.threshold, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from language_detection import LanguageDetector
+
+
+class LanguageSettlingTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = LanguageDetector()
+
+    def _settle(self, languages):
+        window = []
+        for language in languages:
+            window = self.detector.record_detection(window, language)
+        return self.detector.is_language_settled(window)
+
+    def test_settles_after_two_matching_messages(self):
+        self.assertFalse(self._settle(['am']))
+        self.assertEqual(self._settle(['am', 'am']), 'am')
+
+    def test_needs_the_last_three_to_agree_once_there_are_three(self):
+        self.assertFalse(self._settle(['en', 'am', 'am']))
+        self.assertEqual(self._settle(['en', 'am', 'am', 'am']), 'am')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from llm_gateway import PRIORITY_CRISIS, PRIORITY_DETECTION, LLMGateway
+from resilience import GatewayOverloadedError
+
+
+class SlotSheddingTest(unittest.TestCase):
+    def test_shed_slot_raises_overloaded_right_away(self):
+        gateway = LLMGateway(max_concurrency=1, max_queue=1)
+        running, release = threading.Event(), threading.Event()
+        gateway.submit(lambda timeout: running.set() or release.wait(), 5, PRIORITY_DETECTION)
+        running.wait(2)
+
+        async def queued_detection():
+            async with gateway.slot(PRIORITY_DETECTION):
+                pass
+
+        async def run():
+            task = asyncio.ensure_future(queued_detection())
+            while gateway.queue_depth() < 1:
+                await asyncio.sleep(0.01)
+            crisis = gateway.submit(lambda timeout: 'ok', 5, PRIORITY_CRISIS)
+            started = time.monotonic()
+            with self.assertRaises(GatewayOverloadedError):
+                await asyncio.wait_for(task, 2)
+            return time.monotonic() - started, crisis
+
+        try:
+            elapsed, crisis = asyncio.run(run())
+        finally:
+            release.set()
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(crisis.result(timeout=2), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import time
+import unittest
+
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+from benchmarks.fake_gemini import FakeGeminiBackend, LatencyProfile  # noqa: E402
+
+backend = FakeGeminiBackend(latency={stage: LatencyProfile(0) for stage in ('detection', 'generation', 'summary')},
+                            error_rate=0)
+backend.install()
+
+from chat_pipeline import ChatPipeline  # noqa: E402
+from gemini_integration import GeminiChat  # noqa: E402
+from language_detection import LanguageDetector  # noqa: E402
+from llm_gateway import llm_gateway  # noqa: E402
+from local_replies import LocalReplies  # noqa: E402
+from metrics import metrics  # noqa: E402
+from model_backends import LocalBackend, ModelBackend, ModelRouter  # noqa: E402
+
+
+class ModelRouterRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = llm_gateway.caller.breaker
+        self.pipeline = ChatPipeline(GeminiChat(), LanguageDetector())
+        backend.reset()
+
+    def tearDown(self):
+        self.breaker.record_success()
+
+    def _open_breaker(self, opened_seconds_ago: float):
+        self.breaker._failures = self.breaker.failure_threshold
+        self.breaker._opened_at = time.monotonic() - opened_seconds_ago
+
+    def test_open_breaker_routes_to_local(self):
+        self._open_breaker(0)
+        self.assertEqual(self.pipeline.models.backend_for('generation').name, 'local')
+
+        self.pipeline.handle({}, "I can't sleep at night")
+        self.assertEqual(backend.calls['generation'], 0)
+        self.assertTrue(self.breaker.is_open)
+
+    def test_breaker_recovers_through_router_after_cool_down(self):
+        self._open_breaker(self.breaker.reset_seconds + 1)
+        self.assertEqual(self.pipeline.models.backend_for('generation').name, 'gemini')
+
+        self.pipeline.handle({}, "I can't sleep at night")
+        self.assertGreaterEqual(backend.calls['generation'], 1)
+        self.assertFalse(self.breaker.is_open)
+        self.assertEqual(self.pipeline.models.backend_for('generation').name, 'gemini')
+
+    def test_trial_in_flight_keeps_other_calls_local(self):
+        self._open_breaker(self.breaker.reset_seconds + 1)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.pipeline.models.backend_for('generation').name, 'local')
+        self.breaker.abandon_trial()
+        self.assertEqual(self.pipeline.models.backend_for('generation').name, 'gemini')
+
+
+class GatewayQueueFullTest(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = ChatPipeline(GeminiChat(), LanguageDetector())
+        self.max_queue = llm_gateway.max_queue
+        llm_gateway.max_queue = llm_gateway.queue_depth()
+        backend.reset()
+
+    def tearDown(self):
+        llm_gateway.max_queue = self.max_queue
+
+    def test_full_queue_routes_to_local(self):
+        with metrics.capture() as records:
+            payload = self.pipeline.handle({}, "I can't sleep at night, I keep thinking about it")
+        self.assertEqual(backend.calls['generation'], 0)
+        self.assertIn(('alem_backend_reroutes_total', {'stage': 'generation', 'backend': 'local'}, 1), records)
+        self.assertIn(('alem_responses_total', {'path': 'local'}, 1), records)
+        self.assertTrue(payload['response'])
+
+    def test_no_fallback_keeps_the_configured_backend(self):
+        router = ModelRouter(self.pipeline.models.backends, {'generation': 'gemini'}, {'generation': None})
+        self.assertEqual(router.backend_for('generation').name, 'gemini')
+
+
+class LocalBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.gemini_chat = GeminiChat()
+        self.local = LocalBackend(self.gemini_chat, LanguageDetector())
+
+    def test_crisis_messages_get_the_crisis_response(self):
+        message = 'I want to kill myself'
+        expected = self.gemini_chat.crisis_response(message, 'en')
+        self.assertTrue(expected)
+        self.assertEqual(self.local.generate_reply(message, 'en', [message]), expected)
+        self.assertEqual(list(self.local.generate_reply_stream(message, 'en', [message])), [('crisis', expected)])
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class DetectionOnly(ModelBackend):
+            def detect_language(self, text: str) -> str:
+                return 'en'
+
+        with self.assertRaises(TypeError):
+            DetectionOnly()
+
+
+class LocalRepliesTest(unittest.TestCase):
+    def setUp(self):
+        self.replies = LocalReplies()
+
+    def test_topic(self):
+        self.assertEqual(self.replies.topic("I haven't slept in days", 'en'), 'sleep')
+        self.assertEqual(self.replies.topic('ቤተሰቤ ቢያውቁ ምን እንደሚሉ አላውቅም', 'am'), 'family')
+        self.assertEqual(self.replies.topic('Barumsa koo irratti xiyyeeffachuu hin dandeenye', 'om'), 'school')
+        self.assertEqual(self.replies.topic('ኣዝየ ፈሪሐ', 'ti'), 'fear')
+        self.assertEqual(self.replies.topic('what should I do now', 'en'), 'general')
+
+    def test_cues_only_match_their_language(self):
+        self.assertEqual(self.replies.topic('sleep', 'om'), 'general')
+
+    def test_unknown_language_gets_english(self):
+        self.assertIn(self.replies.reply('hello', 'fr'), self.replies.replies['general']['en'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from resilience import CallSupersededError
+from single_flight import SingleFlight
+
+
+class SupersededLeaderTest(unittest.TestCase):
+    def test_waiter_reruns_call_of_superseded_leader(self):
+        single_flight = SingleFlight()
+        leader_started, supersede = threading.Event(), threading.Event()
+        calls = []
+
+        def superseded_call():
+            calls.append('leader')
+            leader_started.set()
+            supersede.wait(2)
+            raise CallSupersededError("generation superseded")
+
+        def call():
+            calls.append('waiter')
+            return 'reply'
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(single_flight.do, 'generation', 'hi', superseded_call)
+            leader_started.wait(2)
+            waiter = executor.submit(single_flight.do, 'generation', 'hi', call)
+            supersede.set()
+
+            with self.assertRaises(CallSupersededError):
+                leader.result(timeout=2)
+            self.assertEqual(waiter.result(timeout=2), ('reply', False))
+        self.assertEqual(calls, ['leader', 'waiter'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from config import Config
+from language_detection import LocalLanguageDetector
+from metrics import metrics
+
+# Below this share of letters in the dominant script a message counts as mixed
+MIXED_SCRIPT_PURITY = 0.8
+
+
+class TraceRecorder:
+    """Writes one content-free trace line per chat request, for replaying realistic traffic
+
+    A trace holds when the request arrived, a keyed pseudonym of its session, the length
+    and script of the message, the path that answered it, stage timings, Gemini calls and
+    token counts, but never any text. Each process appends to its own file in the
+    directory; without a directory nothing is captured or written.
+    """
+
+    def __init__(self, directory: Optional[str] = Config.TRACE_DIR, key: str = Config.SECRET_KEY):
+        self.directory = directory
+        self._key = key.encode('utf-8')
+
+    def pseudonym(self, session_id: Optional[str]) -> Optional[str]:
+        """Stable per session, and not reversible without the secret key"""
+        if not session_id:
+            return None
+        return hmac.new(self._key, b'trace:' + session_id.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    @staticmethod
+    def script(message: str) -> str:
+        script, purity = LocalLanguageDetector.classify_script(message)
+        if script is None:
+            return 'none'
+        return script if purity >= MIXED_SCRIPT_PURITY else 'mixed'
+
+    @contextmanager
+    def record(self, endpoint: str, message: str):
+        """Trace the request served inside the block
+
+        Yields a dict in which the caller sets 'session_id' and, once known, the 'language'
+        of the reply; both are mapped to trace fields rather than written as they are.
+        """
+        trace = {}
+        if not self.directory:
+            yield trace
+            return
+
+        at = time.time()
+        started = time.perf_counter()
+        path = None
+        with metrics.capture() as records:
+            try:
+                yield trace
+            except Exception:
+                path = 'error'
+                raise
+            finally:
+                self._write({
+                    'at': round(at, 3),
+                    'endpoint': endpoint,
+                    'session': self.pseudonym(trace.get('session_id')),
+                    'length': len(message),
+                    'script': self.script(message),
+                    'language': trace.get('language'),
+                    'duration': round(time.perf_counter() - started, 6),
+                    **self.summarize(records, path),
+                })
+
+    @staticmethod
+    def summarize(records: List, path: Optional[str] = None) -> Dict:
+        """Path, stage timings, Gemini calls and tokens out of captured metric records"""
+        stages, calls, tokens = {}, {}, {}
+        for name, labels, value in records:
+            if name == 'alem_responses_total':
+                path = path or labels['path']
+            elif name == 'alem_stage_duration_seconds':
+                stages[labels['stage']] = round(stages.get(labels['stage'], 0) + value, 6)
+            elif name == 'alem_llm_calls_total':
+                calls[labels['stage']] = calls.get(labels['stage'], 0) + value
+            elif name == 'alem_llm_tokens_total':
+                counts = tokens.setdefault(labels['stage'], {})
+                counts[labels['kind']] = counts.get(labels['kind'], 0) + value
+        return {'path': path or 'unknown', 'stages': stages, 'llm_calls': calls, 'tokens': tokens}
+
+    def _write(self, trace: Dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            line = json.dumps(trace, separators=(',', ':')) + '\n'
+            # Single small O_APPEND writes do not interleave between threads
+            fd = os.open(os.path.join(self.directory, f'traces-{os.getpid()}.jsonl'),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.error(f"Error writing request trace: {str(e)}")
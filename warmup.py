@@ -0,0 +1,39 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Warmup:
+    """Start-up work run in a background thread, so a process answers health checks straight away
+
+    Each process runs it once: started again after a fork, it runs in the new worker.
+    Failed steps are logged and left to happen lazily on first use.
+    """
+
+    def __init__(self, *steps: Callable[[], None]):
+        self.steps = steps
+        self.ready = threading.Event()
+        self.duration: Optional[float] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.ready.is_set() or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self.run, name='warmup', daemon=True).start()
+
+    def run(self):
+        started = time.perf_counter()
+        for step in self.steps:
+            try:
+                step()
+            except Exception as e:
+                logging.warning(f"Warm-up step {getattr(step, '__qualname__', step)} failed: {str(e)}")
+        self.duration = time.perf_counter() - started
+        self.ready.set()